@@ -0,0 +1,447 @@
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from Handler import Sketches
+
+# Pure analytics over the enriched watch events and their aggregate cube.
+# Nothing in here imports Streamlit, caches, or writes to its arguments: every
+# function returns new frames or a small frozen result object. The dashboard
+# reaches these through the cached wrappers in Processors and renders them in
+# Plotter; batch workers and benchmarks call them directly.
+
+video_types = ['Long', 'Short']
+# Names of the weekday codes (Monday=0) the results are indexed by; only the
+# charts and cards put names on them
+weekday_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+# --- RESULT TYPES ---
+@dataclass(frozen=True)
+class BingeSession:
+    start: pd.Timestamp
+    end: pd.Timestamp
+    video_count: int
+    total_hours: float
+
+@dataclass(frozen=True, eq=False)
+class ActivityProfile:
+    # Watch hours and video counts per weekday code (Monday=0) and per hour
+    weekday_hours: pd.Series
+    weekday_videos: pd.Series
+    hour_hours: pd.Series
+    hour_videos: pd.Series
+
+    @property
+    def busiest_weekday(self):
+        return self.weekday_hours.idxmax()
+
+    @property
+    def peak_hour(self):
+        return self.hour_hours.idxmax()
+
+@dataclass(frozen=True)
+class Kpis:
+    active_days: int
+    total_days: int
+    consistency: float
+    median_hour: float
+    period: str
+    top_channel: str
+    top_channel_videos: int
+    busiest_day: int  # weekday code
+    hours_watched: float
+    videos_watched: int
+    binge: BingeSession
+    avg_watch_time: float
+
+@dataclass(frozen=True, eq=False)
+class Sessions:
+    # Viewing sessions (runs of videos less than `gap_minutes` apart) and
+    # daily-activity streaks (runs of consecutive active days)
+    gap_minutes: float
+    table: pd.DataFrame    # start, end, video_count, total_hours per session
+    streaks: pd.DataFrame  # first_day, last_day, days per streak
+
+    def top_binges(self, k=5):
+        return self.table.iloc[_top_k(self.table['total_hours'].to_numpy(), k)]
+
+    def length_distribution(self):
+        # Number of sessions by videos per session
+        return self.table['video_count'].value_counts().sort_index()
+
+    @property
+    def longest_streak(self):
+        return int(self.streaks['days'].max()) if len(self.streaks) else 1
+
+    @property
+    def binge(self):
+        best = self.top_binges(1).iloc[0]
+        return BingeSession(best['start'], best['end'], int(best['video_count']), float(best['total_hours']))
+
+@dataclass(frozen=True)
+class Card:
+    # One highlight card: the event shown and its badge
+    title: str
+    url: str
+    timestamp: pd.Timestamp
+    badge: object
+
+@dataclass(frozen=True)
+class Highlights:
+    total_hours: float
+    milestones: tuple
+    top_watched: tuple
+    top_replayed: tuple
+
+@dataclass(frozen=True, eq=False)
+class Conversion:
+    # Searches linked to the watch events that followed them (see
+    # search_conversion)
+    window_minutes: float
+    searches: int
+    converted: int
+    hours: float                  # watch hours the searches led to
+    minutes_to_watch: np.ndarray  # search to first watch, per converted search
+    queries: pd.DataFrame         # searches, converted, rate, videos, hours, median_minutes per query, by hours
+
+    @property
+    def rate(self):
+        return self.converted / self.searches if self.searches else 0.0
+
+    @property
+    def median_minutes(self):
+        return float(np.median(self.minutes_to_watch)) if len(self.minutes_to_watch) else float('nan')
+
+    def top_queries(self, k=10):
+        return self.queries.head(k)
+
+# --- SESSIONIZATION ---
+# Clusters of rapid videos, viewing sessions and daily streaks are all runs in
+# a sorted array: a new run starts wherever the step to the previous element
+# exceeds a threshold. Everything below is a handful of linear array passes.
+
+def _sorted_ns(timestamps):
+    # Event times as int64 nanoseconds in ascending order, plus the sorting
+    # permutation (None when the events already are in order)
+    ns = timestamps.to_numpy('datetime64[ns]').view(np.int64)
+    if len(ns) > 1 and (ns[1:] < ns[:-1]).any():
+        order = np.argsort(ns, kind='stable')
+        return ns[order], order
+    return ns, None
+
+def _run_starts(values, max_step):
+    # True where a run starts: the first element, or a step above `max_step`
+    starts = np.ones(len(values), dtype=bool)
+    np.greater(np.diff(values), max_step, out=starts[1:])
+    return starts
+
+def _runs(starts):
+    # Run id per element, and the first position and length of every run
+    first = np.flatnonzero(starts)
+    return np.cumsum(starts) - 1, first, np.diff(np.r_[first, len(starts)])
+
+def _streaks(days):
+    days = np.asarray(days)
+    if len(days) > 1 and (days[1:] < days[:-1]).any():
+        days = np.sort(days)
+    active = days[_run_starts(days, 0)]  # distinct days
+    _, first, length = _runs(_run_starts(active, 1))
+    return pd.DataFrame({'first_day': active[first], 'last_day': active[first + length - 1], 'days': length})
+
+def sessionize(df, gap_minutes=10):
+    ns, order = _sorted_ns(df['timestamp'])
+    _, first, length = _runs(_run_starts(ns, gap_minutes * 60e9))
+    hours = df['watch_time_hours'].to_numpy()
+    first_rows, last_rows = first, first + length - 1
+    if order is not None:
+        hours, first_rows, last_rows = hours[order], order[first_rows], order[last_rows]
+    table = pd.DataFrame({
+        'start': df['timestamp'].iloc[first_rows].array,
+        'end': df['timestamp'].iloc[last_rows].array,
+        'video_count': length,
+        'total_hours': np.add.reduceat(hours, first) if len(first) else np.empty(0),
+    })
+    return Sessions(gap_minutes, table, _streaks(df['day'].to_numpy()))
+
+# --- PREPROCESSING ---
+def _flag_rapid(df, threshold_seconds):
+    # Expects a sorted copy. Videos in a rapid cluster (two or more videos at
+    # most `threshold_seconds` apart) are flagged.
+    ns, _ = _sorted_ns(df['timestamp'])
+    ids, _, length = _runs(_run_starts(ns, threshold_seconds * 1e9))
+    rapid = length[ids] >= 2
+    df['rapid_flag'] = rapid
+
+    # Combine flags: consider video Short if either condition met
+    df['video_type'] = pd.Categorical.from_codes(rapid.astype(np.int8), categories=video_types)
+    return df
+
+def classify_videos(df, threshold_seconds=90):
+    df = df.sort_values('timestamp', kind='stable').reset_index(drop=True)
+    return _flag_rapid(df, threshold_seconds)
+
+def estimate_watch_time_hours(df, short_duration_min=1, max_long_duration_min=20, default_long_duration_min=5, threshold_seconds=90):
+    # Single stable sort; everything below is computed on the sorted arrays
+    df = df.sort_values('timestamp', kind='stable').reset_index(drop=True)
+
+    # Classify Shorts vs Long
+    df = _flag_rapid(df, threshold_seconds)
+
+    # Estimate watch time in seconds: fixed for Shorts, gap to the next video
+    # for Longs, falling back to the default when the gap is missing or too long
+    to_next = (df['timestamp'].shift(-1) - df['timestamp']).dt.total_seconds().to_numpy()
+    with np.errstate(invalid='ignore'):
+        idle = np.isnan(to_next) | (to_next > max_long_duration_min * 60)
+    watch_time_sec = np.where(idle, default_long_duration_min * 60, to_next)
+    watch_time_sec = np.where(df['rapid_flag'].to_numpy(), short_duration_min * 60, watch_time_sec)
+
+    df['watch_time_hours'] = watch_time_sec / 3600
+    return df
+
+# --- AGGREGATION ---
+def build_cube(df):
+    # One pass over the events: counts and watch hours per
+    # day x hour x weekday x video_type, plus per-channel and per-video totals.
+    # Every chart and KPI is answered from these small tables.
+    cube = (
+        df.groupby(['day', 'week', 'hour', 'weekday', 'video_type'], observed=True)
+        .agg(count=('watch_time_hours', 'size'), hours=('watch_time_hours', 'sum'))
+        .reset_index()
+    )
+    cube['video_type'] = cube['video_type'].astype(object)
+    channels = df.groupby('channel', observed=True).agg(count=('watch_time_hours', 'size'), hours=('watch_time_hours', 'sum'))
+    videos = df.groupby('video_title', observed=True).agg(count=('watch_time_hours', 'size'), hours=('watch_time_hours', 'sum'))
+    channels.index = channels.index.astype(object)
+    videos.index = videos.index.astype(object)
+    return {
+        "cube": cube,
+        "channels": channels.sort_values('count', ascending=False, kind='stable'),
+        "videos": videos.sort_values('count', ascending=False, kind='stable'),
+    }
+
+def _to_dates(days):
+    # Day numbers (days since 1970-01-01) to plottable dates
+    return pd.to_datetime(days, unit='D')
+
+# --- KPIs ---
+def activity_profile(agg):
+    cube = agg['cube']
+    by_day = cube.groupby('weekday')[['hours', 'count']].sum().reindex(range(7))
+    by_hour = cube.groupby('hour')[['hours', 'count']].sum()
+    return ActivityProfile(by_day['hours'], by_day['count'], by_hour['hours'], by_hour['count'])
+
+def binge_session(df):
+    # Session with the most watch time, sessions split at 10-minute gaps
+    return sessionize(df).binge
+
+def longest_streak(days):
+    streaks = _streaks(days)
+    return int(streaks['days'].max()) if len(streaks) else 1
+
+def _median_hour(cube):
+    # Median of the per-event hour, read off the hour histogram
+    counts = cube.groupby('hour')['count'].sum().sort_index()
+    cum = counts.cumsum().to_numpy()
+    n = cum[-1]
+    lo = counts.index[np.searchsorted(cum, (n - 1) // 2, side='right')]
+    hi = counts.index[np.searchsorted(cum, n // 2, side='right')]
+    return (lo + hi) / 2
+
+def calculate_kpis(sessions, agg):
+    # `sessions` is the sessionize result of the events behind `agg`
+    cube, channels = agg['cube'], agg['channels']
+    activity = activity_profile(agg)
+    active_days = cube['day'].nunique()
+    total_days = int(cube['day'].max() - cube['day'].min()) + 1
+    median_hour = _median_hour(cube)
+    top_channel = channels['count'].idxmax()
+    busiest_day = activity.busiest_weekday
+
+    return Kpis(
+        active_days=active_days,
+        total_days=total_days,
+        consistency=100 * active_days / total_days,
+        median_hour=median_hour,
+        period="🌅 Early Bird" if median_hour < 10 else "🌞 Daytime Viewer" if median_hour < 17 else "🌙 Night Owl",
+        top_channel=top_channel,
+        top_channel_videos=channels.loc[top_channel, 'count'],
+        busiest_day=busiest_day,
+        hours_watched=activity.weekday_hours.max(),
+        videos_watched=activity.weekday_videos[busiest_day],
+        binge=sessions.binge,
+        avg_watch_time=channels.loc[top_channel, 'hours'],
+    )
+
+# --- HIGHLIGHTS ---
+MILESTONES = ((1, "1st"), (100, "100th"), (1000, "1000th"))
+
+def _top_k(score, k):
+    # Positions of the k largest scores, best first; ties go to the lower
+    # position. argpartition keeps the selection O(n) instead of a full sort.
+    k = min(k, len(score))
+    if k == 0:
+        return np.empty(0, dtype=np.int64)
+    part = np.argpartition(-score, k - 1)[:k]
+    return part[np.lexsort((part, -score[part]))]
+
+def highlights(df, k=5, milestones=MILESTONES):
+    # Milestone events (1st, 100th, ... video), the k videos with the longest
+    # single watch and the k most replayed videos, from one pass over the
+    # URL codes of the events sorted by time. Events without a URL are skipped.
+    if not df['timestamp'].is_monotonic_increasing:
+        df = df.sort_values('timestamp', kind='stable')
+    codes, _ = pd.factorize(df['url'])
+    hours = df['watch_time_hours'].to_numpy()
+    has_url = codes >= 0
+    valid, valid_hours = codes[has_url], hours[has_url]
+    n_videos = codes.max() + 1 if len(codes) else 0
+
+    replays = np.bincount(valid, minlength=n_videos)
+    longest = np.full(n_videos, -np.inf)
+    np.maximum.at(longest, valid, valid_hours)
+
+    def card(position, badge):
+        row = df.iloc[position]
+        return Card(row['video_title'], row['url'], row['timestamp'], badge)
+
+    def first_row(code, mask=None):
+        match = codes == code if mask is None else (codes == code) & mask
+        return int(match.argmax())
+
+    return Highlights(
+        total_hours=float(hours.sum()),
+        milestones=tuple(card(n - 1, label) for n, label in milestones if n <= len(df)),
+        top_watched=tuple(
+            card(first_row(code, hours == longest[code]), rank)
+            for rank, code in enumerate(_top_k(longest, k), 1)
+        ),
+        top_replayed=tuple(
+            card(first_row(code), f"{replays[code]}× views")
+            for code in _top_k(replays, k)
+        ),
+    )
+
+def watch_type_totals(agg):
+    return agg['cube'].groupby('video_type')['hours'].sum()
+
+# --- CHART DATA ---
+def weekday_counts(agg):
+    return agg['cube'].groupby('weekday')['count'].sum().reindex(range(7))
+
+def video_type_counts(agg):
+    return agg['cube'].groupby('video_type')['count'].sum().sort_values(ascending=False)
+
+def hour_day_counts(agg):
+    # Videos per weekday code (rows) and hour (columns)
+    return agg['cube'].groupby(['weekday', 'hour'])['count'].sum().unstack(fill_value=0).reindex(index=range(7))
+
+def weekly_counts(agg):
+    # Videos per ISO week number, all years folded together
+    cube = agg['cube']
+    return cube.groupby((cube['week'] % 100).rename('week'))['count'].sum()
+
+def daily_counts(agg):
+    counts = agg['cube'].groupby('day')['count'].sum()
+    counts.index = _to_dates(counts.index).rename('date')
+    return counts
+
+def daily_by_type(agg, value='hours'):
+    # Daily `value` ('hours' or 'count') with one column per video type
+    daily = agg['cube'].groupby(['day', 'video_type'])[value].sum().unstack(fill_value=0)
+    daily = daily.reindex(columns=video_types, fill_value=0).sort_index()
+    daily.index = _to_dates(daily.index)
+    return daily
+
+def top_items(table, by='count', n=10):
+    # Top `n` rows of agg['channels'] / agg['videos'] by 'count' or 'hours'.
+    # The tables are already sorted by count.
+    return table['count'].head(n) if by == 'count' else table[by].nlargest(n)
+
+def top_10_videos(agg):
+    return agg['videos']['hours'].sort_values(ascending=False).head(10)
+
+def weekend_split(agg):
+    cube = agg['cube']
+    is_weekend = (cube['weekday'] >= 5).rename('is_weekend')
+    split = cube.groupby([is_weekend, 'video_type'])['hours'].sum().unstack().fillna(0)
+    split.index = split.index.map({False: 'Weekday', True: 'Weekend'})
+    return split
+
+# --- SEARCH ---
+def top_queries(search_df, n=20):
+    return search_df['query'].value_counts().head(n)
+
+def search_intensity(search_df, agg):
+    # Searches per watched video, in percent
+    return 100 * len(search_df) / max(agg['cube']['count'].sum(), 1)
+
+def search_hour_day_counts(search_df):
+    # Searches per weekday code (rows) and hour (columns)
+    return search_df.groupby(['weekday', 'hour']).size().unstack(fill_value=0).reindex(range(7))
+
+def search_watch_daily(search_df, agg):
+    # Daily searches next to daily watched videos
+    searches = search_df.groupby('day').size()
+    searches.index = _to_dates(searches.index).rename('date')
+    return pd.DataFrame({'Searches': searches, 'Watched': daily_counts(agg)}).fillna(0)
+
+# --- SEARCH CONVERSION ---
+CONVERSION_WINDOW_MIN = 30
+
+def search_conversion(search_df, watch_df, window_minutes=CONVERSION_WINDOW_MIN):
+    # Each watch event is credited to the latest search at or before it, if
+    # that search is at most `window_minutes` older: a backward as-of join
+    # done as one searchsorted of the watch times into the sorted search times,
+    # O((n + m) log m) with no cross join. A search converts when it is credited
+    # with at least one watch. Only searches inside the time span of
+    # `watch_df` count, so filtered views are not diluted by other years.
+    search_ns, search_order = _sorted_ns(search_df['timestamp'])
+    watch_ns, watch_order = _sorted_ns(watch_df['timestamp'])
+    queries = search_df['query'] if search_order is None else search_df['query'].iloc[search_order]
+    hours = watch_df['watch_time_hours'].to_numpy(np.float64)
+    if watch_order is not None:
+        hours = hours[watch_order]
+
+    window = int(window_minutes * 60 * 1e9)
+    lo = np.searchsorted(search_ns, watch_ns[0] - window) if len(watch_ns) else 0
+    hi = np.searchsorted(search_ns, watch_ns[-1], side='right') if len(watch_ns) else 0
+    search_ns, queries = search_ns[lo:hi], queries.iloc[lo:hi].reset_index(drop=True)
+
+    owner = np.searchsorted(search_ns, watch_ns, side='right') - 1
+    linked = owner >= 0
+    linked[linked] = watch_ns[linked] - search_ns[owner[linked]] <= window
+    owner, watch_ns, hours = owner[linked], watch_ns[linked], hours[linked]
+
+    # `owner` is non-decreasing, so a search's first watch starts its run
+    n = len(search_ns)
+    videos = np.bincount(owner, minlength=n)
+    led_hours = np.bincount(owner, weights=hours, minlength=n)
+    starts = _run_starts(owner, 0)
+    delay = np.full(n, np.nan)
+    delay[owner[starts]] = (watch_ns[starts] - search_ns[owner[starts]]) / 6e10
+
+    per_search = pd.DataFrame({'query': queries, 'converted': videos > 0, 'videos': videos, 'hours': led_hours, 'minutes': delay})
+    table = per_search.groupby('query', observed=True, sort=False).agg(
+        searches=('converted', 'size'), converted=('converted', 'sum'), videos=('videos', 'sum'),
+        hours=('hours', 'sum'), median_minutes=('minutes', 'median'))
+    table.insert(2, 'rate', table['converted'] / table['searches'])
+    table = table.sort_values(['hours', 'searches'], ascending=False)
+
+    return Conversion(
+        window_minutes=window_minutes,
+        searches=n,
+        converted=int((videos > 0).sum()),
+        hours=float(led_hours.sum()),
+        minutes_to_watch=delay[videos > 0],
+        queries=table,
+    )
+
+# --- SKETCHES ---
+# Approximate distinct counts and top-k per (month, video type) cell, merged
+# for whatever range is selected (see Handler/Sketches.py)
+def watch_sketches(df):
+    return Sketches.build(df, ['channel', 'video_title'])
+
+def search_sketches(search_df):
+    return Sketches.build(search_df, ['query'])
@@ -0,0 +1,392 @@
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+import Analytics
+from Handler import Downsample, Thumbnails
+
+# Figure builders for every chart and highlight card. Nothing in here imports
+# Streamlit: the dashboard renders these through the cached functions in
+# Plotter, and the offline report (Report.py) serialises them into one page.
+TEMPLATE = "plotly_dark"
+
+def _day_names(codes):
+    # Weekday codes (Monday=0) of the analytics results to display names
+    return pd.Index(codes).map(Analytics.weekday_order.__getitem__)
+
+def viewing_by_weekday(agg, template=TEMPLATE):
+    weekday_counts = Analytics.weekday_counts(agg)
+    days = _day_names(weekday_counts.index)
+    fig = px.bar(
+        x=days,
+        y=weekday_counts.values,
+        labels={'x': 'Day of Week', 'y': 'Videos Watched'},
+        template=template,
+        color=days
+    )
+    return fig
+
+def video_type_distribution(agg, template=TEMPLATE):
+    video_type_counts = Analytics.video_type_counts(agg)
+    fig = px.pie(
+        names=video_type_counts.index,
+        values=video_type_counts.values,
+        hole=0.4,
+        template=template
+    )
+    return fig
+
+def hour_day_heatmap(agg, template=TEMPLATE):
+    heatmap_data = Analytics.hour_day_counts(agg)
+    heatmap_data = heatmap_data.set_axis(_day_names(heatmap_data.index).rename('day'))
+    fig = px.imshow(
+        heatmap_data,
+        labels=dict(x="Hour", y="Day", color="Videos Watched"),
+        template=template
+    )
+    return fig
+
+def weekly_viewing_rhythm(agg, template=TEMPLATE):
+    weekly_counts = Analytics.weekly_counts(agg)
+    fig = px.line(
+        x=weekly_counts.index,
+        y=weekly_counts.values,
+        labels={'x': 'Week #', 'y': 'Videos Watched'},
+        template=template
+    )
+    return fig
+
+# --- Interactive Plotting with Plotly ---
+def daily_watch_time_by_type(agg, label, template=TEMPLATE):
+    # Rows kept by the shape of the stacked total, so both layers stay aligned
+    daily_watch_time = Downsample.downsample(Analytics.daily_by_type(agg, 'hours'))
+
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(
+        x=daily_watch_time.index,
+        y=daily_watch_time['Short'],
+        mode='lines',
+        stackgroup='one',
+        name='Shorts',
+        line=dict(color='orange')
+    ))
+    fig.add_trace(go.Scatter(
+        x=daily_watch_time.index,
+        y=daily_watch_time['Long'],
+        mode='lines',
+        stackgroup='one',
+        name='Longs',
+        line=dict(color='blue')
+    ))
+
+    fig.update_layout(
+        title=f"Daily Watch Time (Interactive Stacked Area) - {label}",
+        xaxis_title="Date",
+        yaxis_title="Hours Watched",
+        hovermode='x unified',
+        legend_title_text='Video Type',
+        template=template,
+        height=400
+    )
+    return fig
+
+def daily_watch_count_by_type(agg, label, template=TEMPLATE):
+    daily_counts = Downsample.downsample(Analytics.daily_by_type(agg, 'count'))
+
+    # Prepare figure
+    fig = go.Figure()
+    fig.add_trace(Downsample.scatter(
+        x=daily_counts.index,
+        y=daily_counts['Short'],
+        mode='lines',
+        name='Shorts',
+        line=dict(color='orange')
+    ))
+    fig.add_trace(Downsample.scatter(
+        x=daily_counts.index,
+        y=daily_counts['Long'],
+        mode='lines',
+        name='Longs',
+        line=dict(color='blue')
+    ))
+
+    fig.update_layout(
+        title=f'📊 Daily Video Watch Count by Type - {label}',
+        xaxis_title='Date',
+        yaxis_title='Number of Videos Watched',
+        template=template,
+        hovermode='x unified',
+        legend_title_text='Video Type',
+        height=400
+    )
+    return fig
+
+def top_channels_clicked(agg, label, top_n=15, template=TEMPLATE):
+    top_channels = Analytics.top_items(agg['channels'], 'count', top_n)
+    top_channels_df = top_channels.reset_index()
+    top_channels_df.columns = ['channel', 'count']
+    fig = px.bar(
+        top_channels_df,
+        x='count',
+        y='channel',
+        orientation='h',
+        labels={'count': 'Watch Count', 'channel': 'Channel'},
+        title=f"📺 Top {top_n} most clicked channels - {label}",
+        color="count",
+        template=template
+    )
+    fig.update_layout(yaxis={'categoryorder':'total ascending'})
+    return fig
+
+def top_channels_watched(agg, label, top_n=10, template=TEMPLATE):
+    top_channels = (
+        Analytics.top_items(agg['channels'], 'hours', top_n)
+        .sort_values(ascending=True)  # To invert the bar order
+        .rename('watch_time_hours')
+        .reset_index()
+    )
+
+    fig = px.bar(
+        top_channels,
+        x='watch_time_hours',
+        y='channel',
+        orientation='h',
+        color='watch_time_hours',
+        title=f"📺 Top {top_n} most watched channels - {label}",
+        labels={'watch_time_hours': 'Watch Hours', 'channel': 'Channel'},
+        template=template
+    )
+    fig.update_layout(height=500, showlegend=False)
+    return fig
+
+def usage_trend(agg, template=TEMPLATE):
+    trend = Downsample.downsample(Analytics.daily_counts(agg)).reset_index()
+    fig = px.line(trend, x='date', y='count',
+                  title='Daily YouTube Watch Count',
+                  labels={'count': 'Video Count', 'date': 'Date'},
+                  render_mode='webgl' if Downsample.webgl(len(trend)) else 'svg',
+                  template=template, height=400)
+    return fig
+
+def top_queries(df, top_n=20, template=TEMPLATE):
+    top_queries = Analytics.top_queries(df, top_n)
+    fig = px.bar(
+        x=top_queries.values,
+        y=top_queries.index,
+        orientation='h',
+        labels={'x': 'Search Count', 'y': 'Query'},
+        title=f"Top {top_n} YouTube Search Queries",
+        color=top_queries.values,
+        color_continuous_scale='RdBu',
+        template=template,
+        height=450
+    )
+    fig.update_layout(yaxis={'categoryorder':'total ascending'})
+    return fig
+
+def heavy_hitters(hitters, title, item_label, top_n=10, color_scale='Plasma', template=TEMPLATE):
+    # Top-k from a Misra-Gries summary: bars are the guaranteed counts, the
+    # error bars reach the largest count each item can have
+    top = hitters.top(top_n).reset_index()
+    top['slack'] = top['upper'] - top['count']
+    fig = px.bar(
+        top,
+        x='count',
+        y='item',
+        orientation='h',
+        error_x='slack',
+        error_x_minus=[0] * len(top),
+        labels={'count': 'Count (at least)', 'item': item_label},
+        title=f"{title} (approximate)",
+        color='count',
+        color_continuous_scale=color_scale,
+        template=template,
+        height=450
+    )
+    fig.update_layout(yaxis={'categoryorder':'total ascending'})
+    return fig
+
+def top_videos_clicked(agg, label, top_n=10, template=TEMPLATE):
+    watched_videos = Analytics.top_items(agg['videos'], 'count', top_n)
+    fig = px.bar(
+        x=watched_videos.values,
+        y=watched_videos.index,
+        orientation='h',
+        labels={'x': 'Watch Count', 'y': 'Video Title'},
+        title=f"Top {top_n} most clicked videos - {label}",
+        color=watched_videos.values,
+        color_continuous_scale='Plasma',
+        template=template,
+        height=450
+    )
+    fig.update_layout(yaxis={'categoryorder':'total ascending'})
+    return fig
+
+def top_videos_watched(agg, label, top_n=10, template=TEMPLATE):
+    top_videos = (
+        Analytics.top_items(agg['videos'], 'hours', top_n)
+        .sort_values(ascending=True)
+        .rename('watch_time_hours')
+        .reset_index()
+    )
+    fig = px.bar(
+        top_videos,
+        x='watch_time_hours',
+        y='video_title',
+        color='watch_time_hours',
+        orientation='h',
+        title=f"🎬 Top {top_n} most watched videos - {label}",
+        labels={'watch_time_hours': 'Watch Hours', 'video_title': 'Video'},
+        template=template
+    )
+    fig.update_layout(height=500, showlegend=False)
+    return fig
+
+def search_intensity_gauge(search_df, agg):
+    percent = Analytics.search_intensity(search_df, agg)
+
+    fig = go.Figure(go.Indicator(
+        mode="gauge+number",
+        value=percent,
+        title={'text': "🔍 Search Intensity"},
+        gauge={
+            'axis': {'range': [0, 100]},
+            'bar': {'color': "purple"},
+            'steps': [
+                {'range': [0, 25], 'color': "gray"},
+                {'range': [25, 50], 'color': "orange"},
+                {'range': [50, 100], 'color': "green"}
+            ]
+        }
+    ))
+    return fig
+
+def search_vs_watch(search_df, agg, template=TEMPLATE):
+    combined = Analytics.search_watch_daily(search_df, agg)
+    # Different scales: each trace keeps its own shape
+    searches = Downsample.downsample(combined['Searches'])
+    watched = Downsample.downsample(combined['Watched'])
+
+    fig = go.Figure()
+    fig.add_trace(Downsample.scatter(x=searches.index, y=searches, mode='lines+markers', name='Searches', line=dict(color='lightgreen')))
+    fig.add_trace(Downsample.scatter(x=watched.index, y=watched, mode='lines+markers', name='Watched', line=dict(color='red')))
+    fig.update_layout(
+        title="YouTube Search vs Watch Activity Over Time",
+        xaxis_title="Date",
+        yaxis_title="Count",
+        template=template,
+        height=400
+    )
+    return fig
+
+def time_to_first_watch(conversion, template=TEMPLATE):
+    window_minutes = conversion.window_minutes
+    fig = px.histogram(
+        x=conversion.minutes_to_watch,
+        nbins=min(int(window_minutes), 60),
+        labels={'x': 'Minutes from search to first watch', 'y': 'Searches'},
+        title=f"⏳ Time to First Watch (within {window_minutes} min)",
+        color_discrete_sequence=['mediumpurple'],
+        template=template,
+        height=400
+    )
+    fig.update_layout(yaxis_title='Searches', bargap=0.05)
+    return fig
+
+def top_converting_queries(conversion, top_n=15, template=TEMPLATE):
+    top = conversion.top_queries(top_n).reset_index()
+    fig = px.bar(
+        top,
+        x='hours',
+        y='query',
+        orientation='h',
+        color='rate',
+        hover_data={'searches': True, 'converted': True, 'videos': True, 'rate': ':.0%', 'median_minutes': ':.1f'},
+        labels={'hours': 'Watch Hours Led To', 'query': 'Query', 'rate': 'Conversion'},
+        title=f"🎯 Top {top_n} Queries by Watch Hours Led To",
+        color_continuous_scale='Viridis',
+        template=template,
+        height=450
+    )
+    fig.update_layout(yaxis={'categoryorder': 'total ascending'})
+    return fig
+
+def search_hour_day_heatmap(df, template=TEMPLATE):
+    pivot = Analytics.search_hour_day_counts(df)
+    ordered_days = list(_day_names(pivot.index))
+
+    fig = px.imshow(
+        pivot.values,
+        labels=dict(x="Hour of Day", y="Day of Week", color="Search Count"),
+        x=list(pivot.columns),
+        y=ordered_days,
+        color_continuous_scale='Inferno',
+        aspect="auto",
+        title="YouTube Searches by Hour and Day",
+        template=template,
+        height=400
+    )
+    return fig
+
+def weekend_vs_weekday(agg):
+    split = Analytics.weekend_split(agg)
+
+    fig = px.bar(split, barmode='group', title="📅 Weekend vs Weekday Watching",
+                labels={'value': 'Watch Hours', 'is_weekend': 'Day Type'},
+                text_auto=True)
+    return fig
+
+def card_html(title, url, date, milestone=None, theme="dark"):
+    # Highlight card markup. The thumbnail is inlined from the local cache
+    # (see Thumbnails.prefetch), so the card needs no remote assets.
+    thumbnail_url = Thumbnails.src(url)
+
+    # Define styles based on theme
+    if theme == "dark":
+        card_bg = "#1e1e1e"
+        card_border = "#a3a3a3"
+        text_color = "#fff"
+        badge_bg = "#ffffff"
+        badge_text_color = "#1e1e1e"
+        secondary_text_color = "#bbb"
+        shadow_color = "rgba(0, 0, 0, 0.4)"
+    else:  # Light theme
+        card_bg = "#f9f9f9"
+        card_border = "#ddd"
+        text_color = "#333"
+        badge_bg = "#4CAF50"
+        badge_text_color = "#fff"
+        secondary_text_color = "#666"
+        shadow_color = "rgba(0, 0, 0, 0.1)"
+
+    # Badge HTML
+    badge_html = f"""<div style="background-color: {badge_bg}; color: {badge_text_color}; font-weight: bold; border-radius: 20px; padding: 6px 16px; margin-bottom: 10px; display: inline-block; font-size: 12px;box-shadow: 0px 2px 4px {shadow_color};">{milestone}</div>""" if milestone else ''
+
+    # Card HTML
+    card_html = f"""
+    <div style="
+        border: 1px solid {card_border};
+        border-radius: 16px;
+        padding: 16px;
+        background-color: {card_bg};
+        color: {text_color};
+        text-align: center;
+        font-size: 14px;
+        width: 100%;
+        max-width: 240px;
+        margin: 0 auto;
+        box-shadow: 0px 4px 6px {shadow_color};
+        transition: transform 0.3s ease, box-shadow 0.3s ease;
+    " onmouseover="this.style.transform='scale(1.05)'; this.style.boxShadow='0px 6px 12px {shadow_color}';" 
+       onmouseout="this.style.transform='scale(1)'; this.style.boxShadow='0px 4px 6px {shadow_color}';">
+        {badge_html}
+        <a href="{url}" target="_blank" style="text-decoration: none; color: inherit;">
+            <img src="{thumbnail_url}" width="100%" style="border-radius: 12px; max-width: 220px;" />
+            <div style="font-weight: bold; margin-top: 10px; word-wrap: break-word; font-size: 14px; line-height: 1.5;">
+                {title}
+            </div>
+        </a>
+        <div style='font-size: 12px; color: {secondary_text_color}; margin-top: 8px;'>{date}</div>
+    </div>
+    """
+    return card_html
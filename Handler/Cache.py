@@ -0,0 +1,399 @@
+import collections
+import dataclasses
+import functools
+import hashlib
+import logging
+import os
+import pickle
+import shutil
+import sys
+import threading
+import time
+import weakref
+import numpy as np
+import pandas as pd
+
+from Handler import Profiler
+
+# On-disk cache of parsed takeouts. Each entry is a directory named after the
+# archive key holding one Parquet file per history frame; the directory mtime
+# is refreshed on every hit and drives LRU eviction.
+CACHE_DIR = os.environ.get("YT_WRAPPED_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "youtube_wrapped"))
+CACHE_MAX_MB = float(os.environ.get("YT_WRAPPED_CACHE_MAX_MB", "1024"))
+
+# In-memory results of the dashboard's cached functions and the figures of its
+# charts, shared by every session the server runs (see ResultCache). The base
+# frames of an upload are held by the sessions using them instead (see
+# SessionPins).
+RESULT_CACHE_MB = float(os.environ.get("YT_WRAPPED_RESULT_CACHE_MB", "512"))
+# Offline reports inline plotly.js (several MB each) and get a budget of their
+# own, so building one does not evict the results every chart is drawn from
+REPORT_CACHE_MB = float(os.environ.get("YT_WRAPPED_REPORT_CACHE_MB", "64"))
+
+# Bump whenever the loaders change the shape of the frames they return
+CACHE_VERSION = "4"
+
+FRAMES = ("watch", "search")
+
+def archive_key(infos):
+    # Key on the zip directory entries (name, CRC, size) of the history members,
+    # which identifies their content without decompressing anything.
+    h = hashlib.sha256(CACHE_VERSION.encode())
+    for info in sorted(infos, key=lambda i: i.filename):
+        h.update(f"{info.filename}\0{info.CRC:08x}\0{info.file_size}\n".encode())
+    return h.hexdigest()[:32]
+
+def enabled():
+    return CACHE_MAX_MB > 0
+
+def load(key):
+    entry = os.path.join(CACHE_DIR, key)
+    if not enabled() or not os.path.isdir(entry):
+        return None
+    try:
+        frames = {
+            name: pd.read_parquet(os.path.join(entry, f"{name}.parquet"), memory_map=True)
+            if os.path.exists(os.path.join(entry, f"{name}.parquet")) else None
+            for name in FRAMES
+        }
+    except Exception:
+        shutil.rmtree(entry, ignore_errors=True)
+        return None
+    os.utime(entry)
+    return frames
+
+def store(key, **frames):
+    if not enabled():
+        return
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    entry = os.path.join(CACHE_DIR, key)
+    tmp = f"{entry}.tmp-{os.getpid()}-{time.monotonic_ns()}"
+    os.makedirs(tmp)
+    try:
+        for name, df in frames.items():
+            if df is not None:
+                df.to_parquet(os.path.join(tmp, f"{name}.parquet"))
+        shutil.rmtree(entry, ignore_errors=True)
+        os.replace(tmp, entry)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    evict()
+
+def _size(path):
+    return sum(e.stat().st_size for e in os.scandir(path) if e.is_file())
+
+def evict(max_mb=None):
+    # Drop least recently used entries until the cache fits under the cap
+    limit = (CACHE_MAX_MB if max_mb is None else max_mb) * 1024 * 1024
+    if not os.path.isdir(CACHE_DIR):
+        return
+    entries = [
+        (e.stat().st_mtime, _size(e.path), e.path)
+        for e in os.scandir(CACHE_DIR)
+        if e.is_dir() and ".tmp-" not in e.name
+    ]
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= limit:
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+
+class Dataset:
+    # A frame (or series) paired with a fingerprint computed once when it is
+    # loaded. Cached functions hash the fingerprint instead of the contents, so
+    # a cache lookup costs the same whatever the size of the data.
+    __slots__ = ("df", "key")
+
+    def __init__(self, df, key=None):
+        self.df = df
+        self.key = key or fingerprint(df)
+
+    def derive(self, df, *params):
+        # Handle for data computed from this dataset with the given parameters
+        return Dataset(df, _digest(self.key, *params))
+
+    def __len__(self):
+        return len(self.df)
+
+    def __repr__(self):
+        return f"Dataset({self.key}, {len(self.df)} rows)"
+
+def _digest(*parts):
+    return hashlib.sha256(repr(parts).encode()).hexdigest()[:32]
+
+def fingerprint(df):
+    # Content hash for data that did not come from an archive (one O(n) pass)
+    h = hashlib.sha256(repr((df.shape, str(df.dtypes))).encode())
+    h.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return h.hexdigest()[:32]
+
+SCALARS = (str, bytes, int, float, bool, type(None), pd.Timestamp, np.generic)
+
+def sizeof(value, seen=None):
+    # Estimated memory held by a result: frames and arrays by their buffers
+    # (strings included), containers and plain objects by their contents.
+    # Objects reachable twice are counted once.
+    seen = set() if seen is None else seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True, index=True).sum())
+    if isinstance(value, (pd.Series, pd.Index)):
+        return int(value.memory_usage(deep=True))
+    if hasattr(value, "to_plotly_json"):  # plotly figures, by their data and layout
+        return sizeof(value.to_plotly_json(), seen)
+    if isinstance(value, np.ndarray):
+        return value.nbytes + (sum(map(sys.getsizeof, value.ravel())) if value.dtype == object else 0)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(sizeof(k, seen) + sizeof(v, seen) for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(sizeof(v, seen) for v in value)
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        fields = [getattr(value, f.name) for f in dataclasses.fields(value)]
+    elif hasattr(value, "__dict__"):
+        fields = list(vars(value).values())
+    else:
+        fields = [getattr(value, slot) for cls in type(value).__mro__ for slot in getattr(cls, "__slots__", ()) if hasattr(value, slot)]
+    return sys.getsizeof(value) + sum(sizeof(v, seen) for v in fields)
+
+class ResultCache:
+    # Size-aware LRU of computed results, shared by every session of the
+    # process. Entries are charged their estimated size (sizeof) and the least
+    # recently used ones are evicted to keep the total under the budget.
+    # Results are handed out as they are, not copied: callers must not modify
+    # them. Identical uploads get the same Dataset keys, so sessions working
+    # on the same takeout share one copy of every result.
+    def __init__(self, max_mb):
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._entries = collections.OrderedDict()  # key -> (value, bytes)
+        self._origins = {}  # id(cached value) -> key
+        self._computing = {}  # key -> lock held while it is computed
+        self._lock = threading.Lock()
+        self.bytes = self.hits = self.misses = self.evictions = 0
+
+    def key_of(self, value):
+        # Key of the entry `value` is the result of, while it is cached
+        return self._origins.get(id(value))
+
+    def _lookup(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, self._entries[key][0]
+            return False, None
+
+    def get_or_compute(self, key, compute):
+        found, value = self._lookup(key)
+        if found:
+            return value
+        with self._lock:
+            guard = self._computing.setdefault(key, threading.Lock())
+        # One computation per key: sessions asking for the same result wait
+        # for the first instead of computing their own copy
+        with guard:
+            found, value = self._lookup(key)
+            if found:
+                return value
+            with self._lock:
+                self.misses += 1
+            try:
+                value = compute()
+                self._put(key, value, sizeof(value))
+            finally:
+                with self._lock:
+                    self._computing.pop(key, None)
+        return value
+
+    def _put(self, key, value, size):
+        with self._lock:
+            if size > self.max_bytes:
+                logging.getLogger(__name__).warning(
+                    "%s: result of %.1f MB exceeds the %.0f MB cache budget and is not cached",
+                    key[0], size / 1024 ** 2, self.max_bytes / 1024 ** 2)
+                return
+            self._entries[key] = (value, size)
+            if not isinstance(value, SCALARS):
+                # Scalars share ids (small ints, interned strings): never
+                # mistake another argument for this result
+                self._origins[id(value)] = key
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                old_key, (old, old_size) = self._entries.popitem(last=False)
+                if self._origins.get(id(old)) == old_key:
+                    del self._origins[id(old)]
+                self.bytes -= old_size
+                self.evictions += 1
+
+    def clear(self, name=None):
+        # Drop every entry, or those of one cached function
+        with self._lock:
+            for key in [k for k in self._entries if name is None or k[0] == name]:
+                value, size = self._entries.pop(key)
+                if self._origins.get(id(value)) == key:
+                    del self._origins[id(value)]
+                self.bytes -= size
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else None,
+                "evictions": self.evictions,
+            }
+
+class _Pin:
+    __slots__ = ("value", "bytes", "__weakref__")
+
+    def __init__(self, value):
+        self.value, self.bytes = value, sizeof(value)
+
+class SessionPins:
+    # Base frames of an upload (the parsed takeout, the enriched history),
+    # kept out of the LRU: in there, a history whose frames approach the
+    # budget evicts on every rerun what the next step needs. Every session
+    # pins the value it last got from each function in its session state;
+    # an entry lives as long as some session pins it, and sessions working
+    # on the same upload share it.
+    def __init__(self):
+        self._live = weakref.WeakValueDictionary()  # key -> _Pin
+        self._computing = {}
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def _lookup(self, key):
+        with self._lock:
+            pin = self._live.get(key)
+            if pin is not None:
+                self.hits += 1
+            return pin
+
+    def get_or_compute(self, key, compute):
+        pin = self._lookup(key)
+        if pin is None:
+            with self._lock:
+                guard = self._computing.setdefault(key, threading.Lock())
+            with guard:
+                pin = self._lookup(key)
+                if pin is None:
+                    with self._lock:
+                        self.misses += 1
+                    try:
+                        pin = _Pin(compute())
+                        with self._lock:
+                            self._live[key] = pin
+                    finally:
+                        with self._lock:
+                            self._computing.pop(key, None)
+        _hold(key[0], pin)
+        return pin.value
+
+    def clear(self, name=None):
+        with self._lock:
+            for key in [k for k in self._live.keys() if name is None or k[0] == name]:
+                self._live.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            pins = list(self._live.values())
+        return {"entries": len(pins), "bytes": sum(pin.bytes for pin in pins), "hits": self.hits, "misses": self.misses}
+
+def _hold(name, pin):
+    # Pin `pin` for the current session, replacing its previous value of `name`
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+    ctx = get_script_run_ctx(suppress_warning=True)
+    if ctx is None:
+        return
+    if "_yt_wrapped_pins" not in ctx.session_state:
+        ctx.session_state["_yt_wrapped_pins"] = {}
+    ctx.session_state["_yt_wrapped_pins"][name] = pin
+
+results = ResultCache(RESULT_CACHE_MB)
+reports = ResultCache(REPORT_CACHE_MB)
+datasets = SessionPins()
+
+def arg_key(value):
+    # Cache key of an argument: Datasets by their key, results of cached
+    # functions by the key they were cached under, other data by content
+    if isinstance(value, SCALARS):
+        return value
+    if isinstance(value, Dataset):
+        return value.key
+    origin = results.key_of(value)
+    if origin is not None:
+        return origin
+    if isinstance(value, (list, tuple)):
+        return (type(value).__name__, *map(arg_key, value))
+    if isinstance(value, dict):
+        return ("dict", *((k, arg_key(v)) for k, v in value.items()))
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return fingerprint(value)
+    return _digest(pickle.dumps(value))
+
+def memoize(key, compute):
+    # Base data computed by `compute`, pinned by the sessions using it when
+    # serving the dashboard; batch workers and benchmarks run without
+    # Streamlit and always compute
+    if "streamlit" not in sys.modules:
+        return compute()
+    return datasets.get_or_compute(key, compute)
+
+def _unwrap(value):
+    return value.df if isinstance(value, Dataset) else value
+
+def _caller(func):
+    # Uncached call of `func`, Dataset arguments passed on as the plain frame
+    @functools.wraps(func)
+    def call(*args, **kw):
+        Profiler.miss()
+        return func(*map(_unwrap, args), **{k: _unwrap(v) for k, v in kw.items()})
+    return call
+
+def cache_data(func=None, cache=None):
+    # Results of `func` in a shared ResultCache (`results` unless given) when
+    # the app runs under Streamlit; a plain function otherwise, so batch
+    # workers can run the analytics without Streamlit. Dataset arguments are
+    # keyed by their fingerprint, results of other cached functions by their
+    # entry's key.
+    if func is None:
+        return lambda f: cache_data(f, cache)
+    cache = results if cache is None else cache
+    call = _caller(func)
+    if "streamlit" not in sys.modules:
+        return Profiler.stage(call)
+    name = f"{func.__module__}.{func.__qualname__}"
+
+    @functools.wraps(func)
+    def shared(*args, **kw):
+        key = (name, tuple(map(arg_key, args)), tuple(sorted((k, arg_key(v)) for k, v in kw.items())))
+        return cache.get_or_compute(key, lambda: call(*args, **kw))
+
+    timed = Profiler.stage(shared, cached=True)
+    # __wrapped__ stays the uncached function, for benchmarks
+    timed.__wrapped__, timed.clear = call, lambda: cache.clear(name)
+    return timed
+
+def cache_chart(show):
+    # Decorator for chart renderers: the decorated function builds a figure,
+    # which is cached like any other result (cache_data), so charts count
+    # against the same byte budget; `show` draws it on every run, a few ms
+    # for a built figure.
+    def decorate(func):
+        build = cache_data(func)
+
+        @functools.wraps(func)
+        def draw(*args, **kw):
+            show(build(*args, **kw))
+
+        # __wrapped__ builds and draws without the cache, for benchmarks
+        draw.__wrapped__ = lambda *args, **kw: show(build.__wrapped__(*args, **kw))
+        draw.clear = getattr(build, "clear", None)
+        return draw
+    return decorate
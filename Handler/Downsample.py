@@ -0,0 +1,62 @@
+import os
+import numpy as np
+import plotly.graph_objects as go
+
+# Server-side downsampling for long daily series. Above MAX_POINTS a series is
+# reduced with Largest-Triangle-Three-Buckets, which keeps the peaks and dips
+# that give a line its shape, and traces with more than WEBGL_POINTS points are
+# drawn with WebGL instead of SVG. Figure size and browser render time then
+# stay bounded whatever the length of the history.
+MAX_POINTS = int(os.environ.get("YT_WRAPPED_MAX_POINTS", "1500"))
+WEBGL_POINTS = int(os.environ.get("YT_WRAPPED_WEBGL_POINTS", "1000"))
+
+def _numeric(x):
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        x = x.astype('datetime64[ns]').astype(np.int64)
+    return x.astype(np.float64)
+
+def lttb(x, y, n_out):
+    # Indices of the `n_out` points LTTB keeps (first and last always kept)
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x, y = _numeric(x), np.asarray(y, dtype=np.float64)
+
+    # Buckets over the interior points; one point is picked per bucket
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # The next bucket's centroid is the third corner of the triangle
+        nlo, nhi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        cx, cy = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(area.argmax())
+        keep[i + 1] = a
+    return keep
+
+def downsample(frame, by=None, max_points=None):
+    # Rows of a series or frame indexed by x. `by` picks the column whose shape
+    # decides which rows are kept (default: the series, or the row total), so
+    # all columns keep the same rows and stacked traces stay aligned.
+    max_points = MAX_POINTS if max_points is None else max_points
+    if len(frame) <= max_points:
+        return frame
+    if by is None:
+        y = frame.to_numpy() if frame.ndim == 1 else frame.sum(axis=1).to_numpy()
+    else:
+        y = frame[by].to_numpy()
+    return frame.iloc[lttb(frame.index.to_numpy(), y, max_points)]
+
+def webgl(n_points):
+    return n_points > WEBGL_POINTS
+
+def scatter(x, y, **kwargs):
+    # go.Scatter, or go.Scattergl for long traces. Stacked traces (stackgroup)
+    # have no WebGL counterpart and stay SVG; downsample them instead.
+    if webgl(len(x)) and "stackgroup" not in kwargs:
+        return go.Scattergl(x=x, y=y, **kwargs)
+    return go.Scatter(x=x, y=y, **kwargs)
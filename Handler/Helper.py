@@ -1,22 +1,55 @@
-import inspect
-import uuid
-import pandas as pd
+import functools
+import zoneinfo
 import streamlit as st
 
-period_map = {"Month": "M","Week": "W","Year": "Y"}
+from Handler import Profiler, TimeIndex
 
-def periodize(df, key):
+@functools.lru_cache(maxsize=1)
+def time_zones():
+    return sorted(zoneinfo.available_timezones())
+
+def pick_time_zone(default):
+    # Sidebar picker for the time zone days, hours and weeks are counted in;
+    # starts at the browser's zone when Streamlit knows it
+    zones = time_zones()
+    start = st.context.timezone if st.context.timezone in zones else default
+    return st.sidebar.selectbox("🌍 Time Zone", zones, index=zones.index(start) if start in zones else 0, key="timezone",
+                                help="Days, hours and weeks on every chart are counted in this time zone.")
+
+def period_labels(df, period_ch, index=None):
+    index = index or TimeIndex.build(df)
+    return index.labels(period_ch)
+
+def select_period(df, period_ch, selected_period, index=None):
+    index = index or TimeIndex.build(df)
+    return df.iloc[index.period_slice(period_ch, selected_period)]
+
+@Profiler.stage
+def periodize(df, key, index=None):
+    # `df` must be sorted by timestamp; pass its TimeIndex to skip rebuilding it
     period_ch = st.radio("📅 Period Type", ["Entire", "Year", "Month", "Week"], horizontal=True, key=key+"_radio")
     selected_period=None
     if not period_ch=="Entire":
-        df['period'] = df['timestamp'].dt.tz_localize(None).dt.to_period(period_map.get(period_ch, "Y"))
-        period_labels = sorted(df['period'].astype(str).unique().tolist())
-        selected_period = st.select_slider(f"Select the {period_ch}",options=period_labels,value=period_labels[-1], key=key+"_slider")
+        index = index or TimeIndex.build(df)
+        labels = index.labels(period_ch)
+        selected_period = st.select_slider(f"Select the {period_ch}",options=labels,value=labels[-1], key=key+"_slider")
     if not selected_period==None:
-        selected_period = selected_period or str(df['period'].max())
-        df = df[df['period'].astype(str) == selected_period]
+        selected_period = selected_period or labels[-1]
+        df = select_period(df, period_ch, selected_period, index)
         period_label = selected_period
     else:
         period_label = "All Time"
 
-    return df, period_label
\ No newline at end of file
+    return df, period_label
+
+def lazy_tabs(labels, key):
+    # Tabs that rerun the app on switch and report which one is open, so hidden
+    # tabs can skip their work. Older Streamlit versions render every tab.
+    try:
+        return st.tabs(labels, key=key, on_change="rerun")
+    except TypeError:
+        return st.tabs(labels)
+
+def is_open(tab):
+    # None when the tabs do not track state: treat every tab as open
+    return getattr(tab, "open", None) is not False
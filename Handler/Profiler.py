@@ -0,0 +1,136 @@
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+# Opt-in instrumentation of the processing and plotting stages. Every function
+# wrapped with `stage` (all cache_data functions are) records, per call, its
+# wall time, rows in and out, whether the result cache hit or missed, and the peak
+# memory allocated while it ran. Enable with YT_WRAPPED_PROFILE=1 or the
+# ?profile=1 query parameter; records are kept per script run (per thread, so
+# sessions do not mix) and, when YT_WRAPPED_PROFILE_LOG names a file, appended
+# to it as JSON lines for offline analysis.
+#
+# Peak memory comes from tracemalloc, which slows every allocation of the
+# process down (often 2-3x on pandas code), so only YT_WRAPPED_PROFILE turns
+# it on; ?profile=1 records everything else. The traced peak is process-wide:
+# a stage that overlaps a stage of another thread (a concurrent session)
+# records no peak rather than one inflated or cut short by the other's work.
+# Compare wall times with memory tracing on against each other only.
+ENABLED = os.environ.get("YT_WRAPPED_PROFILE", "").lower() in ("1", "true", "yes")
+LOG_PATH = os.environ.get("YT_WRAPPED_PROFILE_LOG", "")
+
+_state = threading.local()
+_log_lock = threading.Lock()
+_open_lock = threading.Lock()
+_open = []  # frames of the stages running in any thread
+
+def start(enabled=False, label=None):
+    # Begin a new run: drop the previous run's records. Profiling is on when
+    # the environment or the caller (e.g. a query parameter) asks for it.
+    _state.active = ENABLED or enabled
+    _state.run = label or time.strftime("%Y-%m-%dT%H:%M:%S")
+    _state.records = []
+    _state.stack = []
+    if ENABLED and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+def active():
+    return getattr(_state, "active", False)
+
+def records():
+    return list(getattr(_state, "records", []))
+
+def rows(value):
+    # Row count of a stage's input or output, where it has one
+    if isinstance(value, tuple) and value:
+        value = value[0]
+    if hasattr(value, "df"):
+        value = value.df
+    if isinstance(value, dict) and "cube" in value:
+        value = value["cube"]
+    if hasattr(value, "shape") and getattr(value, "ndim", 0):
+        return int(value.shape[0])
+    return None
+
+def _fold_peak():
+    # tracemalloc keeps one peak: fold it into every open stage of this thread
+    # before a nested stage resets it
+    peak = tracemalloc.get_traced_memory()[1]
+    for frame in _state.stack:
+        frame["peak"] = max(frame["peak"], peak)
+
+def _enter(frame):
+    # Register a stage; the peak is reset only while no other thread runs one
+    with _open_lock:
+        others = [f for f in _open if f["thread"] != frame["thread"]]
+        for f in others:
+            f["shared"] = True
+        frame["shared"] = bool(others)
+        if tracemalloc.is_tracing():
+            _fold_peak()
+            frame["base"] = tracemalloc.get_traced_memory()[0]
+            if not others:
+                tracemalloc.reset_peak()
+        _open.append(frame)
+        _state.stack.append(frame)
+
+def _exit(frame):
+    with _open_lock:
+        if tracemalloc.is_tracing():
+            _fold_peak()
+        _state.stack.pop()
+        _open[:] = [f for f in _open if f is not frame]
+
+def _peak_mb(frame):
+    if frame["shared"] or frame["base"] is None or not tracemalloc.is_tracing():
+        return None
+    return round(max(frame["peak"] - frame["base"], 0) / 1024 ** 2, 3)
+
+def miss():
+    # Called from inside a cached function: the cache did not have the result
+    if active() and _state.stack and _state.stack[-1]["cache"]:
+        _state.stack[-1]["cache"] = "miss"
+
+def stage(func=None, name=None, cached=False):
+    # Instrument `func` as a stage; `cached` stages count as cache hits unless
+    # miss() is called while they run
+    if func is None:
+        return lambda f: stage(f, name, cached)
+    name = name or f"{func.__module__.rsplit('.', 1)[-1]}.{func.__name__}"
+
+    @functools.wraps(func)
+    def timed(*args, **kwargs):
+        if not active():
+            return func(*args, **kwargs)
+        frame = {"cache": "hit" if cached else None, "peak": 0, "base": None, "thread": threading.get_ident()}
+        _enter(frame)
+        start_time = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - start_time
+            _exit(frame)
+        _record({
+            "run": _state.run,
+            "stage": name,
+            "seconds": round(seconds, 6),
+            "rows_in": rows(args[0]) if args else None,
+            "rows_out": rows(result),
+            "cache": frame["cache"],
+            "peak_mb": _peak_mb(frame),
+            "depth": len(_state.stack),
+        })
+        return result
+    return timed
+
+def _record(entry):
+    _state.records.append(entry)
+    if LOG_PATH:
+        with _log_lock, open(LOG_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+
+def jsonl(entries=None):
+    return "".join(json.dumps(e) + "\n" for e in (records() if entries is None else entries))
@@ -0,0 +1,241 @@
+import base64
+import os
+import numpy as np
+import pandas as pd
+
+# Mergeable sketches for the approximate-statistics mode. Distinct counts come
+# from HyperLogLog, top-k counts from Misra-Gries heavy-hitter summaries. Both
+# are built once per dataset, one per (month, video type) cell, and any
+# filter made of a month range and a video type is answered by merging cells,
+# never by rescanning the events. Sketches of different accounts merge the
+# same way, since they are keyed by the item strings, not by the categorical
+# codes of one frame.
+#
+# YT_WRAPPED_APPROX=1 turns the mode on by default. The precision of the
+# distinct counts (2^p registers, relative error ~1.04/sqrt(2^p)) and the
+# number of heavy-hitter counters are set by YT_WRAPPED_HLL_PRECISION and
+# YT_WRAPPED_TOPK_COUNTERS.
+APPROX = os.environ.get("YT_WRAPPED_APPROX", "").lower() in ("1", "true", "yes")
+HLL_PRECISION = int(os.environ.get("YT_WRAPPED_HLL_PRECISION", "12"))
+TOPK_COUNTERS = int(os.environ.get("YT_WRAPPED_TOPK_COUNTERS", "200"))
+
+def hash_values(values):
+    # 64-bit hashes of item strings; pandas' hash is keyed with a fixed key, so
+    # hashes agree across processes and sketches built apart can be merged
+    return pd.util.hash_array(np.asarray(values, dtype=object))
+
+def _bit_length(x):
+    # Exact bit length of uint64 values, by binary search on the shifts
+    x = x.copy()
+    n = np.zeros(len(x), dtype=np.int64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        big = x >= np.uint64(1 << shift)
+        n[big] += shift
+        x[big] >>= np.uint64(shift)
+    return n + (x > 0)
+
+def _ranks(hashes, p):
+    # Register of every hash (its first p bits) and the rank the register
+    # keeps the maximum of: the position of the leading 1-bit in the rest
+    bits = 64 - p
+    rest = hashes & np.uint64((1 << bits) - 1)
+    return (hashes >> np.uint64(bits)).astype(np.intp), (bits + 1 - _bit_length(rest)).astype(np.uint8)
+
+class HyperLogLog:
+    __slots__ = ("p", "registers")
+
+    def __init__(self, p=None, registers=None):
+        self.p = HLL_PRECISION if p is None else p
+        self.registers = np.zeros(1 << self.p, dtype=np.uint8) if registers is None else registers
+
+    def add_hashes(self, hashes):
+        index, rank = _ranks(np.asarray(hashes, dtype=np.uint64), self.p)
+        np.maximum.at(self.registers, index, rank)
+        return self
+
+    def update(self, values):
+        return self.add_hashes(hash_values(values))
+
+    @staticmethod
+    def merge_all(sketches):
+        if len({hll.p for hll in sketches}) > 1:
+            raise ValueError("Cannot merge HyperLogLog sketches of different precision")
+        return HyperLogLog(sketches[0].p, np.maximum.reduce([hll.registers for hll in sketches]))
+
+    def merge(self, other):
+        return HyperLogLog.merge_all([self, other])
+
+    def estimate(self):
+        m = len(self.registers)
+        raw = 0.7213 / (1 + 1.079 / m) * m * m / np.ldexp(1.0, -self.registers.astype(np.int64)).sum()
+        zeros = int((self.registers == 0).sum())
+        if raw <= 2.5 * m and zeros:
+            # Small range: linear counting over the empty registers
+            return m * np.log(m / zeros)
+        return float(raw)
+
+    @property
+    def relative_error(self):
+        # Standard error of the estimate
+        return 1.04 / np.sqrt(len(self.registers))
+
+    def to_dict(self):
+        return {"p": self.p, "registers": base64.b64encode(self.registers.tobytes()).decode("ascii")}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d["p"], np.frombuffer(base64.b64decode(d["registers"]), dtype=np.uint8).copy())
+
+def _prune(groups, counts, k):
+    # Misra-Gries pruning of many summaries at once: within each group keep
+    # the k largest counters, all decremented by the group's (k+1)-th largest.
+    # Returns the kept positions (group, then count descending), their new
+    # counts and the decrement of every group.
+    order = np.lexsort((-counts, groups))
+    groups, counts = groups[order], counts[order]
+    n_groups = int(groups.max()) + 1 if len(groups) else 0
+    starts = np.searchsorted(groups, np.arange(n_groups))
+    rank = np.arange(len(groups)) - starts[groups]
+    cut = np.zeros(n_groups, dtype=np.int64)
+    at_cut = rank == k
+    cut[groups[at_cut]] = counts[at_cut]
+    keep = counts > cut[groups]
+    return order[keep], counts[keep] - cut[groups[keep]], cut
+
+class HeavyHitters:
+    # Misra-Gries summary of at most k counters, largest first. Every kept
+    # count is a lower bound at most `error` below the true count, and an item
+    # not kept occurs at most `error` times; error never exceeds n / (k + 1).
+    __slots__ = ("k", "n", "error", "items", "counts")
+
+    def __init__(self, k=None, n=0, error=0, items=None, counts=None):
+        self.k = TOPK_COUNTERS if k is None else k
+        self.n, self.error = n, error
+        self.items = np.empty(0, dtype=object) if items is None else items
+        self.counts = np.empty(0, dtype=np.int64) if counts is None else counts
+
+    @staticmethod
+    def merge_all(summaries):
+        # Counters are summed per item, then pruned once; the errors add up
+        k = min(hh.k for hh in summaries)
+        codes, items = pd.factorize(np.concatenate([hh.items for hh in summaries]))
+        counts = np.bincount(codes, weights=np.concatenate([hh.counts for hh in summaries]), minlength=len(items)).astype(np.int64)
+        kept, counts, cut = _prune(np.zeros(len(items), dtype=np.int64), counts, k)
+        return HeavyHitters(k, sum(hh.n for hh in summaries), sum(hh.error for hh in summaries) + int(cut[0] if len(cut) else 0),
+                            np.asarray(items, dtype=object)[kept], counts)
+
+    def merge(self, other):
+        return HeavyHitters.merge_all([self, other])
+
+    def top(self, n=10):
+        # Lower and upper bounds on the counts of the n largest items
+        return pd.DataFrame({"count": self.counts[:n], "upper": self.counts[:n] + self.error}, index=pd.Index(self.items[:n], name="item"))
+
+    def to_dict(self):
+        return {"k": self.k, "n": self.n, "error": self.error, "items": [str(i) for i in self.items], "counts": self.counts.tolist()}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d["k"], d["n"], d["error"], np.asarray(d["items"], dtype=object), np.asarray(d["counts"], dtype=np.int64))
+
+class Cells:
+    # Sketches of one or more datasets per (month, video type) cell:
+    # {(month "YYYY-MM", video type or None): {column: (HyperLogLog, HeavyHitters)}}
+    __slots__ = ("columns", "cells")
+
+    def __init__(self, columns, cells=None):
+        self.columns = list(columns)
+        self.cells = {} if cells is None else cells
+
+    def select(self, first=None, last=None, video_type=None):
+        # Merged sketches of the months in [first, last] (inclusive,
+        # "YYYY-MM") and the given video type (None: every type)
+        chosen = [
+            sketches for (month, vtype), sketches in self.cells.items()
+            if (first is None or month >= first) and (last is None or month <= last)
+            and (video_type is None or vtype == video_type)
+        ]
+        return {col: _merge_pairs([s[col] for s in chosen]) for col in self.columns}
+
+    def merge(self, other):
+        cells = dict(self.cells)
+        for key, sketches in other.cells.items():
+            cells[key] = {col: _merge_pairs([cells[key][col], s]) for col, s in sketches.items()} if key in cells else sketches
+        return Cells(self.columns, cells)
+
+    def to_dict(self):
+        return {"columns": self.columns, "cells": [
+            {"month": month, "video_type": vtype, **{col: {"hll": hll.to_dict(), "hitters": hh.to_dict()} for col, (hll, hh) in sketches.items()}}
+            for (month, vtype), sketches in self.cells.items()
+        ]}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d["columns"], {
+            (cell["month"], cell["video_type"]): {
+                col: (HyperLogLog.from_dict(cell[col]["hll"]), HeavyHitters.from_dict(cell[col]["hitters"]))
+                for col in d["columns"]
+            }
+            for cell in d["cells"]
+        })
+
+def span(period_label, year_range):
+    # Months ("YYYY-MM", inclusive) a period picked with Helper.periodize
+    # covers within the year range; None for weeks, which cells cannot resolve
+    if period_label == "All Time":
+        return f"{year_range[0]}-01", f"{year_range[1]}-12"
+    if len(period_label) == 4:
+        return f"{period_label}-01", f"{period_label}-12"
+    if len(period_label) == 7:
+        return period_label, period_label
+    return None
+
+def _merge_pairs(pairs):
+    if not pairs:
+        return HyperLogLog(), HeavyHitters()
+    return HyperLogLog.merge_all([hll for hll, _ in pairs]), HeavyHitters.merge_all([hh for _, hh in pairs])
+
+def build(df, columns, k=None, p=None):
+    # One sketch pair per column and (month, video type) cell, vectorised over
+    # all cells: rows are counted per (cell, item code) with one hash count,
+    # item strings are hashed once per distinct category, not once per row.
+    k = TOPK_COUNTERS if k is None else k
+    p = HLL_PRECISION if p is None else p
+    months = df['day'].to_numpy().astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+    if 'video_type' in df:
+        vtypes = df['video_type'].astype('category')
+        type_names, type_codes = list(vtypes.cat.categories), vtypes.cat.codes.to_numpy().astype(np.int64)
+    else:
+        type_names, type_codes = [], np.full(len(df), -1, dtype=np.int64)
+    n_types = len(type_names) + 1
+    cell_ids, cell_keys = pd.factorize(months * n_types + type_codes + 1, sort=True)
+    keys = [
+        (str(np.datetime64(int(key) // n_types, 'M')), type_names[int(key) % n_types - 1] if int(key) % n_types else None)
+        for key in cell_keys
+    ]
+    cells = {key: {} for key in keys}
+
+    for col in columns:
+        values = df[col].astype('category')
+        labels = np.asarray(values.cat.categories, dtype=object)
+        codes = values.cat.codes.to_numpy().astype(np.int64)
+        known = codes >= 0
+        pairs = pd.Series(cell_ids[known] * max(len(labels), 1) + codes[known]).value_counts(sort=False)
+        cell_of, item_of = np.divmod(pairs.index.to_numpy(), max(len(labels), 1))
+        counts = pairs.to_numpy().astype(np.int64)
+
+        # Distinct counts: every cell's registers in one scatter
+        registers = np.zeros((len(keys), 1 << p), dtype=np.uint8)
+        index, rank = _ranks(hash_values(labels)[item_of], p)
+        np.maximum.at(registers, (cell_of, index), rank)
+
+        # Heavy hitters: the exact counts of each cell, pruned to k counters
+        n = np.bincount(cell_of, weights=counts, minlength=len(keys)).astype(np.int64)
+        kept, kept_counts, cut = _prune(cell_of, counts, k)
+        cut = np.r_[cut, np.zeros(len(keys) - len(cut), dtype=np.int64)]
+        bounds = np.searchsorted(cell_of[kept], np.arange(len(keys) + 1))
+        for c, key in enumerate(keys):
+            lo, hi = bounds[c], bounds[c + 1]
+            hitters = HeavyHitters(k, int(n[c]), int(cut[c]), labels[item_of[kept[lo:hi]]], kept_counts[lo:hi])
+            cells[key][col] = (HyperLogLog(p, registers[c]), hitters)
+    return Cells(columns, cells)
@@ -0,0 +1,170 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+
+import Handler.Utils as Utils
+from Handler import TimeIndex
+from Analytics import build_cube, estimate_watch_time_hours, video_types
+
+# Persistent per-account history built up from successive takeout exports.
+#
+# <STORE_DIR>/<account>/
+#   meta.json              high-water marks and part counters
+#   events-00000.parquet   enriched watch events whose estimate is final
+#   tail.parquet           the last two events: the newest final one and the
+#                          newest event, whose estimate is provisional because
+#                          its "time to next video" is still unknown
+#   search-00000.parquet   search history parts
+#   cube/channels/videos.parquet   aggregates, updated incrementally
+#
+# An event's estimate only depends on its neighbours, so ingesting a new export
+# re-estimates just the tail plus the new events and appends them as a new part.
+#
+# Calendar columns are derived in the time zone the account's history was
+# started in (meta "timezone", UTC for stores older than the setting); later
+# exports must be ingested in the same zone.
+
+STORE_DIR = os.environ.get("YT_WRAPPED_STORE_DIR", os.path.join(os.path.expanduser("~"), ".local", "share", "youtube_wrapped"))
+
+CATEGORICAL = ['video_title', 'channel', 'url']
+AGG_KEYS = {"cube": ['day', 'week', 'hour', 'weekday', 'video_type'], "channels": None, "videos": None}
+
+def _dir(account):
+    return os.path.join(STORE_DIR, account)
+
+def _read_meta(account):
+    path = os.path.join(_dir(account), "meta.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def _write_meta(account, meta):
+    path = os.path.join(_dir(account), "meta.json")
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+def _concat(frames):
+    # Concatenating categoricals with different dictionaries falls back to
+    # object columns; encode them again
+    df = pd.concat(frames, ignore_index=True)
+    for col in CATEGORICAL:
+        if col in df and df[col].dtype != 'category':
+            df[col] = df[col].astype('category')
+    if 'video_type' in df and df['video_type'].dtype != 'category':
+        df['video_type'] = pd.Categorical(df['video_type'], categories=video_types)
+    return df
+
+def _upgrade(df, timezone):
+    # Fill in calendar columns missing from parts written by older versions
+    if 'day' not in df:
+        return Utils.add_time_columns(df, timezone)
+    if 'week' not in df:
+        return df.assign(week=TimeIndex.iso_week(df['day'].to_numpy().astype(np.int64)).astype(np.int32))
+    return df
+
+def _timezone(meta):
+    return meta.get("timezone", "UTC") if meta else Utils.TIMEZONE
+
+def _parts(account, prefix):
+    return sorted(name for name in os.listdir(_dir(account)) if name.startswith(prefix + "-"))
+
+def _append_part(account, prefix, df, meta):
+    if df.empty:
+        return
+    n = meta.setdefault(prefix + "_parts", 0)
+    df.to_parquet(os.path.join(_dir(account), f"{prefix}-{n:05d}.parquet"))
+    meta[prefix + "_parts"] = n + 1
+
+def _after_high_water(df, meta, prefix, key):
+    # Rows newer than the stored high-water mark; rows at the mark are kept
+    # only if their (timestamp, key) pair is not stored yet
+    df = df.drop_duplicates(['timestamp', key])
+    if prefix + "_high_water" not in meta:
+        return df
+    hw = pd.Timestamp(meta[prefix + "_high_water"])
+    df = df[df['timestamp'] >= hw]
+    seen = df['timestamp'].eq(hw) & df[key].astype(object).fillna("").isin(meta[prefix + "_high_water_keys"])
+    return df[~seen]
+
+def _mark_high_water(df, meta, prefix, key):
+    hw = df['timestamp'].max()
+    meta[prefix + "_high_water"] = hw.isoformat()
+    meta[prefix + "_high_water_keys"] = df.loc[df['timestamp'] == hw, key].astype(object).fillna("").tolist()
+
+def _merge_agg(agg, delta, sign=1):
+    merged = {}
+    for name, keys in AGG_KEYS.items():
+        right = delta[name].copy()
+        right[['count', 'hours']] *= sign
+        if keys is None:
+            both = pd.concat([agg[name], right]).groupby(level=0).sum()
+        else:
+            both = pd.concat([agg[name], right]).groupby(keys, as_index=False).sum()
+        both = both[both['count'] > 0]
+        merged[name] = both.sort_values('count', ascending=False, kind='stable') if keys is None else both
+    return merged
+
+def _save_agg(account, agg):
+    for name, df in agg.items():
+        df.to_parquet(os.path.join(_dir(account), f"{name}.parquet"))
+
+def load_aggregates(account):
+    agg = {name: pd.read_parquet(os.path.join(_dir(account), f"{name}.parquet")) for name in AGG_KEYS}
+    agg["cube"] = _upgrade(agg["cube"], None)
+    return agg
+
+def load_events(account):
+    # Full enriched watch history of an account
+    tail = pd.read_parquet(os.path.join(_dir(account), "tail.parquet"))
+    parts = [pd.read_parquet(os.path.join(_dir(account), name)) for name in _parts(account, "events")]
+    return _upgrade(_concat(parts + [tail.iloc[-1:]]), None)
+
+def load_searches(account):
+    parts = [pd.read_parquet(os.path.join(_dir(account), name)) for name in _parts(account, "search")]
+    return _upgrade(_concat(parts), _timezone(_read_meta(account))) if parts else None
+
+def ingest(account, zip_file, **estimate_kwargs):
+    # Merge a takeout export into the account's history; returns the number of
+    # new watch events. Only the stored tail and the new events are estimated.
+    os.makedirs(_dir(account), exist_ok=True)
+    meta = _read_meta(account) or {}
+    meta["timezone"] = _timezone(meta)
+    if meta["timezone"] != Utils.TIMEZONE:
+        raise ValueError(f"The history of {account} is kept in {meta['timezone']}; ingest it with that time zone, not {Utils.TIMEZONE}")
+    watch_df, search_df = Utils.load_takeout(zip_file)
+    added = 0
+
+    if watch_df is not None:
+        new = _after_high_water(watch_df, meta, "events", "url")
+        if not new.empty:
+            tail_path = os.path.join(_dir(account), "tail.parquet")
+            if os.path.exists(tail_path):
+                tail = _upgrade(pd.read_parquet(tail_path), None)
+                window = estimate_watch_time_hours(_concat([tail, new]), **estimate_kwargs)
+                # Everything before the old provisional event is already final
+                # and stored; that event gets its final estimate now
+                seam = len(tail) - 1
+                final = window.iloc[seam:-1]
+                agg = _merge_agg(load_aggregates(account), build_cube(tail.iloc[-1:]), sign=-1)
+                agg = _merge_agg(agg, build_cube(window.iloc[seam:]))
+            else:
+                window = estimate_watch_time_hours(new, **estimate_kwargs)
+                final = window.iloc[:-1]
+                agg = build_cube(window)
+            _append_part(account, "events", final, meta)
+            window.iloc[-2:].to_parquet(tail_path)
+            _save_agg(account, agg)
+            _mark_high_water(window, meta, "events", "url")
+            added = len(new)
+
+    if search_df is not None:
+        new_searches = _after_high_water(search_df, meta, "search", "query")
+        if not new_searches.empty:
+            _append_part(account, "search", new_searches.sort_values('timestamp', kind='stable'), meta)
+            _mark_high_water(new_searches, meta, "search", "query")
+
+    _write_meta(account, meta)
+    return added
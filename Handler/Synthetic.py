@@ -0,0 +1,95 @@
+import json
+import zipfile
+from itertools import islice
+import numpy as np
+
+# Synthetic Google Takeout archives for benchmarking. The histories mimic the
+# real export: newest entry first, mostly long videos watched minutes apart,
+# bursts of Shorts seconds apart, a few removed videos without subtitles and
+# ad entries carrying a `details` list, plus a search history around the
+# start of viewing sessions.
+
+WATCH_MEMBER = "Takeout/YouTube and YouTube Music/history/watch-history.json"
+SEARCH_MEMBER = "Takeout/YouTube and YouTube Music/history/search-history.json"
+
+HEADER = '"header":"YouTube"'
+PRODUCTS = '"products":["YouTube"],"activityControls":["YouTube watch history"]'
+
+def _timestamps(rng, n, start, span_days):
+    # Sessions of geometric length; Shorts sessions have 5-60 s gaps, long
+    # sessions lognormal gaps around 8 minutes, sessions spread over the span.
+    lengths = rng.geometric(1 / 12, size=n // 4 + 16)
+    lengths = lengths[:np.searchsorted(np.cumsum(lengths), n) + 1]
+    lengths[-1] -= lengths.sum() - n
+    session = np.repeat(np.arange(len(lengths)), lengths)
+    shorts = (rng.random(len(lengths)) < 0.35)[session]
+
+    gaps = np.where(shorts, rng.uniform(5, 60, n), np.clip(rng.lognormal(np.log(480), 0.8, n), 60, 3600))
+    firsts = np.r_[0, np.cumsum(lengths)[:-1]]
+    gaps[firsts] = rng.exponential(span_days * 86400 / len(lengths), len(lengths))
+    gaps += rng.uniform(0.001, 0.999, n)  # distinct, millisecond-resolution times
+    offsets_ms = np.cumsum(gaps * 1000).astype(np.int64)
+    return np.datetime64(start, 'ms') + offsets_ms.astype('timedelta64[ms]'), firsts
+
+def _iso(times):
+    return np.char.add(np.datetime_as_string(times, unit='ms'), 'Z')
+
+def _write_array(z, member, lines, chunk=100_000):
+    # Stream the entries into the zip member without holding them all
+    with z.open(member, 'w', force_zip64=True) as f:
+        f.write(b'[')
+        sep = '\n'
+        while True:
+            block = list(islice(lines, chunk))
+            if not block:
+                break
+            f.write((sep + ',\n'.join(block)).encode('utf-8'))
+            sep = ',\n'
+        f.write(b'\n]')
+
+def write_takeout(path, n_events, seed=0, start='2019-01-01', span_days=None,
+                  removed_ratio=0.03, ad_ratio=0.02, search_ratio=0.2):
+    # Write a takeout zip with `n_events` watch-history entries (ads included)
+    rng = np.random.default_rng(seed)
+    span_days = span_days or int(min(max(n_events / 60, 30), 3650))
+    times, firsts = _timestamps(rng, n_events, start, span_days)
+
+    n_videos = max(n_events // 4, 10)
+    n_channels = max(n_videos // 20, 5)
+    video = (rng.zipf(1.3, n_events) - 1) % n_videos
+    kind = rng.random(n_events)
+    removed = kind < removed_ratio
+    ad = (kind >= removed_ratio) & (kind < removed_ratio + ad_ratio)
+
+    titles = [json.dumps(f"Watched Video {v} – episode {v % 97}", ensure_ascii=False) for v in range(n_videos)]
+    channels = [json.dumps(f"Channel {c}") for c in range(n_channels)]
+    iso = _iso(times)
+
+    def watch_lines():
+        for i in range(n_events - 1, -1, -1):
+            if removed[i]:
+                yield f'{{{HEADER},"title":"Watched a video that has been removed","time":"{iso[i]}",{PRODUCTS}}}'
+                continue
+            v = video[i]
+            body = (f'{{{HEADER},"title":{titles[v]},"titleUrl":"https://www.youtube.com/watch?v={v:011d}",'
+                    f'"subtitles":[{{"name":{channels[v % n_channels]},"url":"https://www.youtube.com/channel/{v % n_channels}"}}],'
+                    f'"time":"{iso[i]}",{PRODUCTS}')
+            if ad[i]:
+                body += ',"details":[{"name":"From Google Ads"}]'
+            yield body + '}'
+
+    # Searches land shortly before a sample of session starts
+    n_search = int(n_events * search_ratio)
+    anchors = rng.choice(firsts, size=n_search)
+    search_times = np.sort(times[anchors] - rng.integers(5_000, 60_000, n_search).astype('timedelta64[ms]'))
+    queries = rng.zipf(1.5, n_search) % max(n_search // 3, 10)
+    search_iso = _iso(search_times)
+    searches = (
+        f'{{{HEADER},"title":"Searched for query {queries[i]}","titleUrl":"https://www.youtube.com/results?search_query\\u003dquery+{queries[i]}","time":"{search_iso[i]}",{PRODUCTS}}}'
+        for i in range(n_search - 1, -1, -1)
+    )
+
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as z:
+        _write_array(z, WATCH_MEMBER, watch_lines())
+        _write_array(z, SEARCH_MEMBER, searches)
+    return path
@@ -0,0 +1,156 @@
+import base64
+import os
+import re
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+# Video thumbnails for the highlight cards. The thumbnails a page needs are
+# fetched once, concurrently, into a bounded on-disk LRU cache and embedded in
+# the page as data URIs, so browsers never call out to img.youtube.com and
+# air-gapped deployments still get pictures (or a placeholder).
+#
+# YT_WRAPPED_THUMB_SOURCE picks the fetcher: unset (or "remote") for
+# img.youtube.com, a directory holding <video id>.jpg files for a local
+# stand-in, or "off" to only ever serve what is already cached. Air-gapped
+# hosts should set a directory or "off": the remote fetcher waits out its
+# timeout on every thumbnail it cannot reach. Videos the fetcher had nothing
+# for are recorded next to the thumbnails and not asked for again for
+# THUMB_MISS_HOURS.
+THUMB_DIR = os.environ.get("YT_WRAPPED_THUMB_DIR", os.path.join(os.path.expanduser("~"), ".cache", "youtube_wrapped_thumbnails"))
+THUMB_MAX_MB = float(os.environ.get("YT_WRAPPED_THUMB_MAX_MB", "64"))
+THUMB_SOURCE = os.environ.get("YT_WRAPPED_THUMB_SOURCE", "")
+THUMB_MISS_HOURS = float(os.environ.get("YT_WRAPPED_THUMB_MISS_HOURS", "24"))
+
+VIDEO_ID = re.compile(r'(?:v=|youtu\.be/)([a-zA-Z0-9_-]{11})')
+REMOTE_URL = "https://img.youtube.com/vi/{}/hqdefault.jpg"
+
+PLACEHOLDER_SVG = (
+    '<svg xmlns="http://www.w3.org/2000/svg" width="480" height="360" viewBox="0 0 480 360">'
+    '<rect width="480" height="360" fill="#2b2b2b"/>'
+    '<circle cx="240" cy="180" r="56" fill="#3d3d3d"/>'
+    '<path d="M222 150 L272 180 L222 210 Z" fill="#8a8a8a"/></svg>'
+)
+PLACEHOLDER = "data:image/svg+xml;utf8," + quote(PLACEHOLDER_SVG)
+
+def video_id(url):
+    match = VIDEO_ID.search(url) if isinstance(url, str) else None
+    return match.group(1) if match else None
+
+# --- FETCHERS ---
+# A fetcher maps a video id to the JPEG bytes of its thumbnail, or None.
+
+def remote_fetcher(vid, timeout=5):
+    try:
+        with urllib.request.urlopen(REMOTE_URL.format(vid), timeout=timeout) as response:
+            return response.read() if response.status == 200 else None
+    except OSError:
+        return None
+
+def local_fetcher(directory):
+    def fetch(vid):
+        path = os.path.join(directory, f"{vid}.jpg")
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            return f.read()
+    return fetch
+
+def fetcher_for(source):
+    # Fetcher for a YT_WRAPPED_THUMB_SOURCE value ("remote" spells out the default)
+    if source.lower() == "off":
+        return None
+    return remote_fetcher if source in ("", "remote") else local_fetcher(source)
+
+fetcher = fetcher_for(THUMB_SOURCE)
+
+# --- CACHE ---
+def path(vid):
+    return os.path.join(THUMB_DIR, f"{vid}.jpg")
+
+def _miss_path(vid):
+    return os.path.join(THUMB_DIR, f"{vid}.miss")
+
+def _missing(vid):
+    # Whether the fetcher came back empty for `vid` recently
+    try:
+        return time.time() - os.stat(_miss_path(vid)).st_mtime < THUMB_MISS_HOURS * 3600
+    except OSError:
+        return False
+
+def _record_miss(vid):
+    os.makedirs(THUMB_DIR, exist_ok=True)
+    with open(_miss_path(vid), "wb"):
+        pass
+
+def _store(vid, data):
+    os.makedirs(THUMB_DIR, exist_ok=True)
+    tmp = f"{path(vid)}.tmp-{os.getpid()}-{time.monotonic_ns()}"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path(vid))
+
+def _stat(entry):
+    try:
+        st = entry.stat()
+    except FileNotFoundError:  # removed by another session
+        return None
+    return st.st_mtime, st.st_size, entry.path
+
+def _remove(p):
+    try:
+        os.remove(p)
+    except FileNotFoundError:
+        pass
+
+def evict(max_mb=None):
+    # Drop least recently used thumbnails until the directory fits the cap,
+    # and miss records that have expired
+    limit = (THUMB_MAX_MB if max_mb is None else max_mb) * 1024 * 1024
+    if not os.path.isdir(THUMB_DIR):
+        return
+    entries, expired = [], time.time() - THUMB_MISS_HOURS * 3600
+    for e in os.scandir(THUMB_DIR):
+        stat = _stat(e) if e.name.endswith((".jpg", ".miss")) else None
+        if stat is None:
+            continue
+        if e.name.endswith(".jpg"):
+            entries.append(stat)
+        elif stat[0] < expired:
+            _remove(e.path)
+    total = sum(size for _, size, _ in entries)
+    for _, size, p in sorted(entries):
+        if total <= limit:
+            break
+        _remove(p)
+        total -= size
+
+def prefetch(urls, workers=8):
+    # Fetch the thumbnails of `urls` that are not cached yet, concurrently
+    ids = {vid for vid in map(video_id, urls) if vid}
+    todo = [vid for vid in ids if not os.path.exists(path(vid)) and not _missing(vid)]
+    if not todo or fetcher is None:
+        return
+    with ThreadPoolExecutor(max_workers=min(workers, len(todo))) as pool:
+        for vid, data in zip(todo, pool.map(fetcher, todo)):
+            if data:
+                _store(vid, data)
+            else:
+                _record_miss(vid)
+    evict()
+
+def src(url):
+    # Inline image source for a card: the cached thumbnail as a data URI, or
+    # the placeholder when there is none. Never fetches: pages prefetch all
+    # their cards' thumbnails at once before rendering them.
+    vid = video_id(url)
+    if vid is None:
+        return PLACEHOLDER
+    try:
+        with open(path(vid), "rb") as f:
+            data = f.read()
+        os.utime(path(vid))
+    except OSError:
+        return PLACEHOLDER
+    return "data:image/jpeg;base64," + base64.b64encode(data).decode("ascii")
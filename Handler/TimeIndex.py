@@ -0,0 +1,82 @@
+import numpy as np
+
+# Period boundaries of a frame sorted by timestamp. For every granularity the
+# index keeps the start of each period present and the row offset where it
+# begins, so listing the periods reads the index and selecting a period or a
+# year range is a searchsorted plus a positional (zero-copy) slice. Periods are
+# calendar periods of the local day numbers (Utils.add_time_columns); weeks run
+# Monday to Sunday and are labelled like pandas weekly periods
+# ("2024-05-06/2024-05-12").
+
+GRANULARITIES = ("Year", "Month", "Week")
+
+# --- CALENDAR ---
+# Integer calendar arithmetic on day numbers (days since 1970-01-01)
+
+def weekday(days):
+    # Monday is 0; 1970-01-01 was a Thursday
+    return (days + 3) % 7
+
+def iso_week(days):
+    # ISO 8601 year and week as YYYYWW: weeks start on Monday and belong to
+    # the year their Thursday falls in
+    thursday = days - weekday(days) + 3
+    year = thursday.astype('datetime64[D]').astype('datetime64[Y]')
+    week = (thursday - year.astype('datetime64[D]').astype(np.int64)) // 7 + 1
+    return (year.astype(np.int64) + 1970) * 100 + week
+
+def _period_starts(days, granularity):
+    if granularity == "Year":
+        return days.astype('datetime64[D]').astype('datetime64[Y]')
+    if granularity == "Month":
+        return days.astype('datetime64[D]').astype('datetime64[M]')
+    return (days - weekday(days)).astype('datetime64[D]')
+
+class TimeIndex:
+    __slots__ = ("n", "bounds")
+
+    def __init__(self, days):
+        # Local day numbers of events sorted by time. They can step back where
+        # a time zone turns its clocks back across midnight; those events
+        # count towards the later day, so every period stays one row range.
+        days = np.maximum.accumulate(np.asarray(days, dtype=np.int64))
+        self.n = len(days)
+        self.bounds = {}
+        for granularity in GRANULARITIES:
+            keys = _period_starts(days, granularity)
+            starts = np.flatnonzero(keys[1:] != keys[:-1]) + 1
+            starts = np.r_[0, starts] if self.n else starts
+            self.bounds[granularity] = (keys[starts], np.r_[starts, self.n])
+
+    def labels(self, granularity):
+        starts, _ = self.bounds[granularity]
+        if granularity == "Week":
+            first = np.datetime_as_string(starts, unit='D')
+            last = np.datetime_as_string(starts + np.timedelta64(6, 'D'), unit='D')
+            return [f"{a}/{b}" for a, b in zip(first, last)]
+        return np.datetime_as_string(starts, unit='Y' if granularity == "Year" else 'M').tolist()
+
+    def years(self):
+        return (self.bounds["Year"][0].astype(np.int64) + 1970).tolist()
+
+    def _span(self, granularity, lo, hi):
+        # Rows of the periods starting in [lo, hi)
+        starts, offsets = self.bounds[granularity]
+        i, j = np.searchsorted(starts, [lo, hi])
+        return slice(int(offsets[i]), int(offsets[j]))
+
+    def period_slice(self, granularity, label):
+        if granularity == "Week":
+            start = np.datetime64(label[:10], 'D')
+            return self._span(granularity, start, start + np.timedelta64(1, 'D'))
+        unit = 'Y' if granularity == "Year" else 'M'
+        start = np.datetime64(label, unit)
+        return self._span(granularity, start, start + np.timedelta64(1, unit))
+
+    def year_slice(self, first, last):
+        return self._span("Year", np.datetime64(str(first), 'Y'), np.datetime64(str(last + 1), 'Y'))
+
+def build(df):
+    if not df['timestamp'].is_monotonic_increasing:
+        raise ValueError("TimeIndex needs events sorted by timestamp")
+    return TimeIndex(df['day'].to_numpy())
@@ -0,0 +1,198 @@
+import html
+import inspect
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import plotly.graph_objects as go
+import plotly.io as pio
+from plotly.offline import get_plotlyjs
+
+import Analytics
+import Figures
+from Handler import Thumbnails
+
+# Offline "Wrapped" report: the KPI cards, highlight cards and every chart of
+# the dashboard in one self-contained HTML file. plotly.js is inlined, charts
+# are embedded as figure JSON and thumbnails as data URIs, so the file opens
+# without a server or network access.
+#
+# Figures are independent, so they are built in REPORT_WORKERS processes
+# (YT_WRAPPED_REPORT_WORKERS, default: all cores). Tasks are sent in one chunk
+# per worker so the aggregates are pickled once per worker, not per figure.
+# Batch workers already run one account per process and build in-process.
+REPORT_WORKERS = int(os.environ.get("YT_WRAPPED_REPORT_WORKERS", os.cpu_count() or 1))
+
+STYLE = """
+body { background: #0e1117; color: #fafafa; font-family: "Source Sans Pro", Helvetica, Arial, sans-serif; margin: 0 auto; max-width: 1200px; padding: 24px; }
+h1 { margin-bottom: 0; }
+h2 { border-bottom: 1px solid #333; padding-bottom: 6px; margin-top: 40px; }
+.subtitle { color: #aaa; margin-top: 4px; }
+.metrics { display: grid; grid-template-columns: repeat(auto-fit, minmax(200px, 1fr)); gap: 12px; margin: 16px 0; }
+.metric { border: 1px solid #333; border-radius: 8px; padding: 12px 16px; }
+.metric .label { color: #aaa; font-size: 14px; }
+.metric .value { font-size: 28px; margin: 4px 0; }
+.metric .note { color: #3dd56d; font-size: 13px; }
+.cards { display: grid; grid-template-columns: repeat(auto-fit, minmax(200px, 1fr)); gap: 16px; margin: 12px 0 24px; }
+.chart { min-height: 400px; margin: 12px 0; }
+"""
+
+# --- FIGURES ---
+
+# The dark template is sent once with the page and applied to every chart in
+# the browser. Figures are built against a slim copy holding only the colours
+# plotly express assigns traces from: validating the full template is a third
+# of the build time of a figure.
+DARK_TEMPLATE = pio.templates[Figures.TEMPLATE]
+SLIM_TEMPLATE = go.layout.Template(layout={'colorway': DARK_TEMPLATE.layout.colorway, 'colorscale': DARK_TEMPLATE.layout.colorscale})
+
+def _tasks(df, agg, search_df):
+    # (section, Figures builder, args) for every chart of the dashboard
+    label = "All Time"
+    tasks = [
+        ("📈 Watch Trends", "daily_watch_time_by_type", (agg, label)),
+        ("📈 Watch Trends", "daily_watch_count_by_type", (agg, label)),
+        ("📈 Watch Trends", "usage_trend", (agg,)),
+        ("🎥 Top Channels", "top_channels_clicked", (agg, label)),
+        ("🎥 Top Channels", "top_channels_watched", (agg, label)),
+        ("🎬 Top Videos", "top_videos_clicked", (agg, label)),
+        ("🎬 Top Videos", "top_videos_watched", (agg, label)),
+        ("📅 Behavioural Insights", "viewing_by_weekday", (agg,)),
+        ("📅 Behavioural Insights", "weekend_vs_weekday", (agg,)),
+        ("📅 Behavioural Insights", "video_type_distribution", (agg,)),
+        ("📅 Behavioural Insights", "hour_day_heatmap", (agg,)),
+        ("📅 Behavioural Insights", "weekly_viewing_rhythm", (agg,)),
+    ]
+    if search_df is not None and not search_df.empty:
+        conversion = Analytics.search_conversion(search_df, df)
+        tasks += [
+            ("🔍 Search Trends", "search_intensity_gauge", (search_df, agg)),
+            ("🔍 Search Trends", "top_queries", (search_df,)),
+            ("🔍 Search Trends", "search_hour_day_heatmap", (search_df,)),
+            ("🔍 Search Trends", "search_vs_watch", (search_df, agg)),
+            ("🔍 Search Trends", "top_converting_queries", (conversion,)),
+            ("🔍 Search Trends", "time_to_first_watch", (conversion,)),
+        ]
+    return tasks
+
+def _figure(name, args):
+    builder = getattr(Figures, name)
+    kwargs = {'template': SLIM_TEMPLATE} if 'template' in inspect.signature(builder).parameters else {}
+    fig = builder(*args, **kwargs)
+    fig.layout.template = None
+    return fig.to_json()
+
+def _build(chunk):
+    # Figure JSON of (builder, args) pairs, in order
+    return [_figure(name, args) for name, args in chunk]
+
+def build_figures(tasks, workers=None):
+    workers = min(REPORT_WORKERS if workers is None else workers, len(tasks))
+    specs = [(name, args) for _, name, args in tasks]
+    if workers <= 1:
+        return _build(specs)
+    # Round-robin chunks: the heavy daily charts land on different workers
+    chunks = [specs[i::workers] for i in range(workers)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        built = list(pool.map(_build, chunks))
+    figures = [None] * len(specs)
+    for i, chunk in enumerate(built):
+        figures[i::workers] = chunk
+    return figures
+
+# --- PAGE ---
+
+def _metric(label, value, note=""):
+    return (f'<div class="metric"><div class="label">{html.escape(label)}</div>'
+            f'<div class="value">{html.escape(str(value))}</div><div class="note">{html.escape(str(note))}</div></div>')
+
+def _metrics(df, agg):
+    sessions = Analytics.sessionize(df)
+    kpis = Analytics.calculate_kpis(sessions, agg)
+    activity = Analytics.activity_profile(agg)
+    peak_hour = activity.peak_hour
+    hours = df['watch_time_hours']
+    totals = [
+        _metric("⌛ Total Hours", f"{hours.sum():.1f} hrs", f"{int(hours.sum() / 24)} days of YouTube"),
+        _metric("🟠 Shorts", f"{hours[df['video_type'] == 'Short'].sum():.1f} hrs"),
+        _metric("🔵 Longs", f"{hours[df['video_type'] == 'Long'].sum():.1f} hrs"),
+        _metric("📺 Channels", f"{df['channel'].nunique():,}"),
+        _metric("🎞️ Videos", f"{df['video_title'].nunique():,}"),
+    ]
+    patterns = [
+        _metric("📆 Busiest Day", Analytics.weekday_order[kpis.busiest_day], f"{kpis.hours_watched:.2f} hrs | {kpis.videos_watched} video(s)"),
+        _metric("⏰ Peak Hour", f"{peak_hour}:00", f"{activity.hour_hours[peak_hour]:.2f} hrs | {activity.hour_videos[peak_hour]} video(s)"),
+        _metric("🔥 Longest Binge", f"{kpis.binge.total_hours:.2f} hrs", f"{kpis.binge.video_count} video(s)"),
+        _metric("📅 Consistency", f"{kpis.consistency:.1f}%", f"{kpis.active_days:,} active / {kpis.total_days:,} days"),
+        _metric("🕒 Preferred Time", f"{int(kpis.median_hour)}:00", kpis.period),
+        _metric("❤️ Favorite Creator", kpis.top_channel, f"{kpis.top_channel_videos} video(s) | {kpis.avg_watch_time:.1f} hrs"),
+        _metric("📈 Longest Streak", f"{sessions.longest_streak} days", "Consecutively active"),
+    ]
+    return "".join(totals), "".join(patterns)
+
+def _cards(df):
+    hl = Analytics.highlights(df)
+    Thumbnails.prefetch([card.url for card in hl.milestones + hl.top_watched + hl.top_replayed])
+    rows = []
+    for heading, cards in [("📽️ Milestone Moments", hl.milestones), ("🏆 Top 5 Videos Watched", hl.top_watched),
+                           ("🔁 Top 5 Replayed Videos", hl.top_replayed)]:
+        items = "".join(
+            Figures.card_html(html.escape(str(card.title)), html.escape(str(card.url)), card.timestamp.strftime('%Y-%m-%d'),
+                              html.escape(str(card.badge)) if card.badge else None)
+            for card in cards
+        )
+        rows.append(f"<h3>{heading}</h3><div class=\"cards\">{items}</div>")
+    return "".join(rows)
+
+def render(df, agg, search_df=None, title="YouTube Wrapped", workers=None):
+    # `df` is the enriched watch history (estimate_watch_time_hours), sorted
+    # by time, and `agg` its build_cube
+    tasks = _tasks(df, agg, search_df)
+    figures = build_figures(tasks, workers)
+    totals, patterns = _metrics(df, agg)
+    first, last = df['timestamp'].iloc[0], df['timestamp'].iloc[-1]
+
+    body, section = [], None
+    for i, (heading, _, _) in enumerate(tasks):
+        if heading != section:
+            body.append(f"<h2>{heading}</h2>")
+            section = heading
+        body.append(f'<div class="chart" id="figure-{i}"></div>')
+    # Figure JSON goes inside a <script>: keep titles from closing it
+    payload = "[" + ",".join(figures) + "]"
+    payload = payload.replace("</", "<\\/")
+    template = pio.json.to_json_plotly(DARK_TEMPLATE).replace("</", "<\\/")
+
+    return f"""<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>{html.escape(title)}</title>
+<style>{STYLE}</style>
+<script type="text/javascript">{get_plotlyjs()}</script>
+</head>
+<body>
+<h1>📺 {html.escape(title)}</h1>
+<p class="subtitle">{first:%d %b %Y} – {last:%d %b %Y}</p>
+<div class="metrics">{totals}</div>
+<h2>🗓️ Highlights</h2>
+<div class="metrics">{patterns}</div>
+{_cards(df)}
+{"".join(body)}
+<script type="text/javascript">
+const template = {template};
+const figures = {payload};
+figures.forEach((figure, i) => {{
+  figure.layout.template = template;
+  Plotly.newPlot("figure-" + i, figure.data, figure.layout, {{responsive: true, displaylogo: false}});
+}});
+</script>
+</body>
+</html>
+"""
+
+def write(path, df, agg, search_df=None, title="YouTube Wrapped", workers=None):
+    page = render(df, agg, search_df, title, workers)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(page)
+    return path
@@ -0,0 +1,461 @@
+import argparse
+import gc
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+# Loaders and the pure Analytics module are imported before Streamlit;
+# Plotter's cached functions are unwrapped below.
+import Handler.Utils as Utils
+from Handler import Synthetic, TimeIndex
+import Analytics
+
+# Benchmark suite for the processing pipeline.
+#
+#   python benchmarks.py --sizes 10k,100k,1m            time + memory every stage
+#   python benchmarks.py --sizes 100k --check           also compare against the
+#                                                       reference implementations
+#                                                       and check the serving rules
+#   python benchmarks.py --compare bench_results/<sha>.json
+#   python benchmarks.py --startup                      cold start of the upload
+#                                                       screen against its budget
+#
+# Synthetic takeouts are generated once per size under --data, results are
+# written to --out as <commit>.json so two commits can be compared.
+
+SIZE_SUFFIXES = {"k": 1_000, "m": 1_000_000}
+
+def parse_size(text):
+    text = text.strip().lower()
+    if text[-1] in SIZE_SUFFIXES:
+        return int(float(text[:-1]) * SIZE_SUFFIXES[text[-1]])
+    return int(text)
+
+def _unwrap(func):
+    return getattr(func, "__wrapped__", func)
+
+def _commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def _rows(value):
+    if isinstance(value, tuple):
+        value = value[0]
+    if isinstance(value, dict) and "cube" in value:
+        value = value["cube"]
+    return len(value) if hasattr(value, "__len__") and not isinstance(value, (str, dict)) else None
+
+def measure(func, *args, repeat=1, memory=True):
+    # Best-of-`repeat` wall time, plus peak traced allocation from one extra run
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    peak = None
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        func(*args)
+        peak = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+    return result, {"seconds": round(best, 6), "peak_mb": None if peak is None else round(peak, 2)}
+
+# --- REFERENCE IMPLEMENTATIONS (as of the first optimisation pass) ---
+
+def reference_load_watch(f):
+    df = pd.read_json(f)
+    df['timestamp'] = pd.to_datetime(df['time'], errors='coerce')
+    df['date'] = pd.to_datetime(df['timestamp']).dt.date
+    df['year'] = df['timestamp'].dt.year
+    df['video_title'] = df['title'].astype(str)
+    df['video_title'] = df['video_title'].str.extract(r'Watched(.*)')
+    df['channel'] = df['subtitles'].apply(lambda x: x[0]['name'] if isinstance(x, list) and 'name' in x[0] else None)
+    df['url'] = df['titleUrl']
+    df = df[df.details.isna()]
+    return df[['timestamp', 'video_title', 'channel', 'url', 'date', 'year']]
+
+def reference_estimate(df, short_duration_min=1, max_long_duration_min=20, default_long_duration_min=5):
+    df = df.sort_values('timestamp').reset_index(drop=True)
+    df['time_to_next'] = df['timestamp'].shift(-1) - df['timestamp']
+    df['time_to_next_sec'] = df['time_to_next'].dt.total_seconds()
+    df['time_diff'] = df['timestamp'].diff().dt.total_seconds().fillna(9999)
+    short_gaps = df['time_diff'] <= 90
+    cluster_id = (short_gaps == False).cumsum()
+    df['rapid_flag'] = cluster_id.map(cluster_id.value_counts()) >= 2
+    df['video_type'] = 'Long'
+    df.loc[df['rapid_flag'], 'video_type'] = 'Short'
+
+    def compute_watch_time(row):
+        if row['video_type'] == 'Short':
+            return short_duration_min * 60
+        elif pd.isna(row['time_to_next_sec']) or row['time_to_next_sec'] > max_long_duration_min * 60:
+            return default_long_duration_min * 60
+        else:
+            return row['time_to_next_sec']
+
+    df['watch_time_sec'] = df.apply(compute_watch_time, axis=1)
+    df['watch_time_hours'] = df['watch_time_sec'] / 3600
+    df['date'] = df['timestamp'].dt.date
+    return df
+
+def reference_binge_session(df):
+    df = df.sort_values('timestamp').copy()
+    df['gap_min'] = df['timestamp'].diff().dt.total_seconds().div(60).fillna(0)
+    df['session_id'] = (df['gap_min'] > 10).cumsum()
+    sessions = df.groupby('session_id').agg(
+        start=('timestamp', 'min'), end=('timestamp', 'max'),
+        video_count=('video_title', 'count'), total_hours=('watch_time_hours', 'sum'))
+    return sessions.sort_values('total_hours', ascending=False).iloc[0]
+
+def reference_longest_streak(dates):
+    sorted_dates = sorted(set(dates))
+    streak, max_streak = 1, 1
+    for j in range(1, len(sorted_dates)):
+        if (sorted_dates[j] - sorted_dates[j-1]).days == 1:
+            streak += 1
+            max_streak = max(max_streak, streak)
+        else:
+            streak = 1
+    return max_streak
+
+def reference_kpis(df):
+    weekday_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+    by_day = df.groupby(df['timestamp'].dt.day_name())['watch_time_hours'].sum().reindex(weekday_order)
+    active_days = df['date'].nunique()
+    total_days = (df['timestamp'].max().date() - df['timestamp'].min().date()).days + 1
+    top_channel = df['channel'].value_counts().idxmax()
+    return {
+        "active_days": active_days,
+        "total_days": total_days,
+        "median_hour": df['timestamp'].dt.hour.median(),
+        "top_channel": top_channel,
+        "busiest_day": weekday_order.index(by_day.idxmax()),
+        "hours_watched": by_day.max(),
+        "avg_watch_time": df[df['channel'] == top_channel]['watch_time_hours'].sum(),
+    }
+
+def reference_highlights(df):
+    milestones = [df.sort_values('timestamp').iloc[index] for index in (0, 99, 999) if index < len(df)]
+    df = df[df['url'].notna()]
+    top5_watched = df.sort_values('watch_time_hours', ascending=False).drop_duplicates('url').head(5)
+    return milestones, top5_watched, df['url'].value_counts().head(5)
+
+def reference_periodize(df, period_ch, selected_period):
+    period = df['timestamp'].dt.tz_localize(None).dt.to_period({"Month": "M", "Week": "W", "Year": "Y"}[period_ch])
+    return df[period.astype(str) == selected_period]
+
+def reference_search_conversion(search, df, window_minutes=30):
+    window = pd.Timedelta(minutes=window_minutes)
+    searches = search.reset_index(drop=True).rename_axis('sid').reset_index().rename(columns={'timestamp': 'searched'})
+    searches = searches[(searches['searched'] >= df['timestamp'].min() - window) & (searches['searched'] <= df['timestamp'].max())]
+    linked = pd.merge_asof(df[['timestamp', 'watch_time_hours']].sort_values('timestamp'), searches.sort_values('searched'),
+                           left_on='timestamp', right_on='searched', direction='backward', tolerance=window).dropna(subset=['sid'])
+    return {"searches": len(searches), "converted": linked['sid'].nunique(), "hours": linked['watch_time_hours'].sum()}
+
+# --- SUITE ---
+
+def _open_member(path, suffix):
+    z = zipfile.ZipFile(path)
+    name = next(n for n in z.namelist() if n.endswith(suffix))
+    return z.open(name)
+
+def run_size(path, repeat, memory):
+    from Handler import Helper
+    results, out = {}, {}
+
+    def stage(name, func, *args):
+        value, stats = measure(func, *args, repeat=repeat, memory=memory)
+        stats["rows_out"] = _rows(value)
+        results[name] = stats
+        out[name] = value
+        print(f"    {name:<44} {stats['seconds']:>9.4f}s" + (f" {stats['peak_mb']:>9.1f} MB" if memory else ""))
+        return value
+
+    watch = stage("load_youtube_watch_history", lambda: Utils.load_youtube_watch_history(_open_member(path, "watch-history.json")))
+    search = stage("load_youtube_search_history", lambda: Utils.load_youtube_search_history(_open_member(path, "search-history.json")))
+    watch = stage("add_time_columns", Utils.add_time_columns, watch)
+    search = stage("add_time_columns[search]", Utils.add_time_columns, search)
+    df = stage("estimate_watch_time_hours", Analytics.estimate_watch_time_hours, watch)
+    agg = stage("build_cube", Analytics.build_cube, df)
+    sessions = stage("sessionize", Analytics.sessionize, df)
+    stage("calculate_kpis", Analytics.calculate_kpis, sessions, agg)
+    stage("binge_session", Analytics.binge_session, df)
+    stage("longest_streak", Analytics.longest_streak, df['day'])
+    stage("highlights", Analytics.highlights, df)
+    stage("search_conversion", Analytics.search_conversion, search, df)
+    stage("watch_sketches", Analytics.watch_sketches, df)
+    index = stage("time_index", TimeIndex.build, df)
+    last_month = index.labels("Month")[-1]
+    stage("periodize[Month]", lambda: Helper.select_period(df, "Month", index.labels("Month")[-1], index))
+
+    logging.disable(logging.WARNING)  # Streamlit's bare-mode warnings on every chart
+    import Plotter
+    for name in ["plot_viewing_by_weekday", "plot_video_type_distribution", "plot_hour_day_heatmap",
+                 "plot_weekly_viewing_rhythm", "plot_weekend_vs_weekday", "plot_youtube_usage_trend_interactive"]:
+        stage(name, _unwrap(getattr(Plotter, name)), agg)
+    for name in ["plot_daily_video_watch_time_by_type", "plot_daily_video_watch_count_by_type",
+                 "plot_top_channels_clicked", "plot_top_channels_watched",
+                 "plot_top_videos_clicked", "plot_top_videos_watched"]:
+        stage(name, _unwrap(getattr(Plotter, name)), agg, "All Time")
+    stage("plot_search_temporal_patterns_interactive", _unwrap(Plotter.plot_search_temporal_patterns_interactive), search)
+    stage("compare_search_watch_trends_interactive", _unwrap(Plotter.compare_search_watch_trends_interactive), search, agg)
+
+    out["last_month"] = last_month
+    return results, out
+
+def check_size(path, out):
+    # Compare the optimised pipeline with the reference implementations
+    checks = {}
+    ref = reference_load_watch(_open_member(path, "watch-history.json")).reset_index(drop=True)
+    watch = out["load_youtube_watch_history"]
+    checks["loader"] = (
+        len(ref) == len(watch)
+        and ref['timestamp'].equals(watch['timestamp'])
+        and ref['video_title'].equals(watch['video_title'].astype(object))
+        and ref['channel'].fillna("").equals(watch['channel'].astype(object).fillna(""))
+        and ref['url'].fillna("").equals(watch['url'].astype(object).fillna(""))
+    )
+
+    ref_df = reference_estimate(ref)
+    df = out["estimate_watch_time_hours"]
+    checks["estimate_watch_time_hours"] = (
+        ref_df['timestamp'].equals(df['timestamp'])
+        and ref_df['watch_time_hours'].equals(df['watch_time_hours'])
+        and ref_df['video_type'].equals(df['video_type'].astype(object))
+        and ref_df['rapid_flag'].equals(df['rapid_flag'])
+    )
+
+    ref_binge, binge = reference_binge_session(ref_df), out["binge_session"]
+    checks["binge_session"] = all(ref_binge[k] == getattr(binge, k) for k in ["start", "end", "video_count"]) and np.isclose(ref_binge["total_hours"], binge.total_hours)
+    checks["longest_streak"] = reference_longest_streak(ref_df['date']) == out["longest_streak"]
+
+    ref_kpis, kpis = reference_kpis(ref_df), out["calculate_kpis"]
+    checks["calculate_kpis"] = all(
+        np.isclose(ref_kpis[k], getattr(kpis, k)) if isinstance(ref_kpis[k], float) else ref_kpis[k] == getattr(kpis, k)
+        for k in ref_kpis
+    )
+
+    ref_milestones, ref_watched, ref_replayed = reference_highlights(ref_df)
+    hl = out["highlights"]
+    checks["highlights"] = (
+        [row['url'] for row in ref_milestones] == [card.url for card in hl.milestones]
+        and np.allclose(ref_watched['watch_time_hours'], [ref_df.loc[ref_df['url'] == card.url, 'watch_time_hours'].max() for card in hl.top_watched])
+        and ref_replayed.tolist() == [int(card.badge.split("×")[0]) for card in hl.top_replayed]
+    )
+
+    ref_conversion, conversion = reference_search_conversion(out["load_youtube_search_history"], ref_df), out["search_conversion"]
+    checks["search_conversion"] = (
+        ref_conversion["searches"] == conversion.searches
+        and ref_conversion["converted"] == conversion.converted
+        and np.isclose(ref_conversion["hours"], conversion.hours)
+    )
+
+    from Handler import Helper
+    ref_month = reference_periodize(ref_df, "Month", out["last_month"])
+    checks["periodize"] = ref_month['timestamp'].reset_index(drop=True).equals(
+        Helper.select_period(df, "Month", out["last_month"])['timestamp'].reset_index(drop=True))
+
+    for name, ok in checks.items():
+        print(f"    check {name:<38} {'ok' if ok else 'MISMATCH'}")
+    return checks
+
+def compare(base_path, current):
+    with open(base_path, encoding="utf-8") as f:
+        base = json.load(f)
+    print(f"\nComparison with {base.get('commit')} (ratio < 1 is faster):")
+    for size, stages in current["sizes"].items():
+        for name, stats in stages.items():
+            before = base["sizes"].get(size, {}).get(name)
+            if before and before["seconds"]:
+                print(f"  {size:>9} {name:<42} {before['seconds']:>9.4f}s -> {stats['seconds']:>9.4f}s  x{stats['seconds'] / before['seconds']:.2f}")
+
+# --- STARTUP ---
+# The upload screen must not pull in the data stack: these modules load only
+# once a takeout is uploaded or a tab is drawn (modules Streamlit imports
+# itself are not held against the app).
+STARTUP_BUDGET_MS = float(os.environ.get("YT_WRAPPED_STARTUP_BUDGET_MS", "250"))
+DEFERRED_MODULES = ["pandas", "numpy", "plotly", "matplotlib", "seaborn", "wordcloud", "Plotter", "Processors", "Analytics"]
+
+STARTUP_SCRIPT = """
+import json, logging, runpy, sys, time
+start = time.perf_counter()
+import streamlit
+base = time.perf_counter()
+preloaded = set(sys.modules)
+logging.disable(logging.WARNING)
+runpy.run_path(sys.argv[1], run_name="__main__")
+end = time.perf_counter()
+print(json.dumps({"streamlit_ms": (base - start) * 1000, "app_ms": (end - base) * 1000, "modules": sorted(set(sys.modules) - preloaded)}))
+"""
+
+def startup(budget_ms, repeat):
+    # App time on top of Streamlit's own import, best of `repeat` fresh
+    # interpreters, for a bare run with nothing uploaded
+    app = os.path.join(os.path.dirname(os.path.abspath(__file__)), "youtube_wrapped.py")
+    runs = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT, app], capture_output=True, text=True, check=True, cwd=os.path.dirname(app))
+        runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    best = min(runs, key=lambda r: r["app_ms"])
+    loaded = [m for m in DEFERRED_MODULES if any(n == m or n.startswith(m + ".") for n in best["modules"])]
+    print(f"startup: streamlit {best['streamlit_ms']:.0f} ms, app {best['app_ms']:.0f} ms (budget {budget_ms:.0f} ms)")
+    if loaded:
+        print(f"  loaded before upload: {', '.join(loaded)}")
+    ok = best["app_ms"] <= budget_ms and not loaded
+    print(f"  {'ok' if ok else 'FAILED'}")
+    return {"streamlit_ms": best["streamlit_ms"], "app_ms": best["app_ms"], "loaded": loaded, "ok": ok}
+
+# --- SERVING ---
+# Checks of how the pipeline behaves inside the Streamlit server, each run in
+# a fresh interpreter so importing Streamlit does not leak into the stages.
+
+PARSE_SCRIPT = """
+import json, os, sys
+if sys.argv[2] == "streamlit":
+    import streamlit
+from Handler import Cache
+import Handler.Utils as Utils
+Cache.CACHE_MAX_MB = 0
+Utils.PARSE_WORKERS = 2
+forks = []
+os.register_at_fork(before=lambda: forks.append(1))
+Utils.load_takeout(sys.argv[1])
+print(json.dumps({"forks": len(forks)}))
+"""
+
+PROFILE_SCRIPT = """
+import json, threading, time, tracemalloc
+from Handler import Profiler
+stage = Profiler.stage(lambda wait: time.sleep(wait), name="wait")
+Profiler.ENABLED = False
+Profiler.start(True)
+stage(0)
+query = {"tracing": tracemalloc.is_tracing(), "peak": Profiler.records()[-1]["peak_mb"]}
+Profiler.ENABLED = True
+peaks = []
+def session(wait):
+    Profiler.start()
+    stage(wait)
+    peaks.append(Profiler.records()[-1]["peak_mb"])
+threads = [threading.Thread(target=session, args=(0.3,)), threading.Thread(target=session, args=(0,))]
+threads[0].start(); time.sleep(0.1); threads[1].start()
+for t in threads:
+    t.join()
+session(0)
+print(json.dumps({"query": query, "peaks": peaks}))
+"""
+
+RERUN_SCRIPT = """
+import json, logging, os, re, sys, tempfile
+os.environ["YT_WRAPPED_CACHE_DIR"] = tempfile.mkdtemp()
+os.environ["YT_WRAPPED_THUMB_SOURCE"] = "off"
+logging.disable(logging.WARNING)
+from streamlit.testing.v1 import AppTest
+from Handler import Cache, Synthetic
+# Two years of history, so the year filter has a range
+path = os.path.join(tempfile.mkdtemp(), "takeout.zip")
+Synthetic.write_takeout(path, int(sys.argv[1]), span_days=730)
+data = open(path, "rb").read()
+
+def misses(at):
+    caption = next(c.value for c in at.caption if "stage calls" in c.value)
+    return int(re.search(r"(\\d+) miss", caption).group(1))
+
+def session():
+    at = AppTest.from_file("youtube_wrapped.py", default_timeout=600)
+    at.query_params["profile"] = "1"
+    at.run()
+    at.file_uploader[0].set_value(("takeout.zip", data, "application/zip")).run()
+    return at
+
+# Budget the shared cache for what the first tab derives from the upload,
+# with a little room, then serve a new session and rerun it
+session()
+derived = sum(size for key, (_, size) in Cache.results._entries.items()
+              if key[0] not in ("takeout", "Analytics.estimate_watch_time_hours"))
+Cache.results.clear()
+Cache.results.max_bytes = int(derived * 1.25)
+at = session()
+at.run()
+print(json.dumps({"misses": misses(at), "exceptions": len(at.exception)}))
+"""
+
+def _script(script, *args):
+    root = os.path.dirname(os.path.abspath(__file__))
+    out = subprocess.run([sys.executable, "-c", script, *args], capture_output=True, text=True, check=True, cwd=root)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def check_serving(path, events):
+    # The server is multithreaded and must never be forked: members are
+    # parsed in-process under Streamlit (batch runs do fork, which shows the
+    # check would notice). ?profile=1 must not turn on tracemalloc for the
+    # whole process, and overlapping sessions must not report each other's
+    # peaks. A rerun must hit the cache for every stage whenever the results
+    # derived from an upload fit the budget, however large the upload.
+    profile = _script(PROFILE_SCRIPT)
+    checks = {
+        "parse_forks_only_in_batch": _script(PARSE_SCRIPT, path, "streamlit")["forks"] == 0
+                                     and _script(PARSE_SCRIPT, path, "batch")["forks"] > 0,
+        "profile_memory_opt_in": profile["query"] == {"tracing": False, "peak": None},
+        "profile_peaks_per_session": profile["peaks"][:2] == [None, None] and profile["peaks"][2] is not None,
+        "rerun_hits_when_results_fit": _script(RERUN_SCRIPT, str(events)) == {"misses": 0, "exceptions": 0},
+    }
+    for name, ok in checks.items():
+        print(f"    check {name:<38} {'ok' if ok else 'MISMATCH'}")
+    return checks
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the YouTube Wrapped pipeline on synthetic takeouts.")
+    parser.add_argument("--sizes", default="10k,100k", help="comma-separated watch-event counts, e.g. 10k,100k,1m,10m")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per stage (best is kept)")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc peak-allocation run")
+    parser.add_argument("--check", action="store_true", help="compare outputs against the reference implementations")
+    parser.add_argument("--check-max", default="1m", help="largest size the (slow) reference check runs on")
+    parser.add_argument("--data", default="bench_data", help="directory for the generated takeouts")
+    parser.add_argument("--out", default="bench_results", help="directory for the result files")
+    parser.add_argument("--compare", help="result file of another commit to compare against")
+    parser.add_argument("--startup", action="store_true", help="only time the cold start of the upload screen")
+    parser.add_argument("--startup-budget-ms", type=float, default=STARTUP_BUDGET_MS, help="app import time allowed on top of Streamlit's")
+    args = parser.parse_args(argv)
+
+    if args.startup:
+        return 0 if startup(args.startup_budget_ms, args.repeat)["ok"] else 1
+
+    os.makedirs(args.data, exist_ok=True)
+    os.makedirs(args.out, exist_ok=True)
+    report = {"commit": _commit(), "python": sys.version.split()[0], "pandas": pd.__version__, "sizes": {}}
+    failed = False
+    for size in [parse_size(s) for s in args.sizes.split(",")]:
+        path = os.path.join(args.data, f"takeout-{size}.zip")
+        if not os.path.exists(path):
+            print(f"Generating {path} ...")
+            Synthetic.write_takeout(path, size)
+        print(f"{size:,} watch events:")
+        results, out = run_size(path, args.repeat, not args.no_memory)
+        report["sizes"][str(size)] = results
+        if args.check and size <= parse_size(args.check_max):
+            failed |= not all(check_size(path, out).values())
+            failed |= not all(check_serving(path, size).values())
+
+    result_path = os.path.join(args.out, f"{report['commit']}.json")
+    with open(result_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {result_path}")
+    if args.compare:
+        compare(args.compare, report)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
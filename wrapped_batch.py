@@ -0,0 +1,225 @@
+import argparse
+import dataclasses
+import json
+import os
+import re
+import sys
+import time
+import zoneinfo
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+# Headless "Wrapped" generation for a directory of takeout archives.
+#
+#   python wrapped_batch.py takeouts/ -o wrapped/ -j 8
+#
+# Every archive is processed in its own worker process (load, estimate watch
+# time, aggregate, KPIs) and written as <account>.kpis.json plus the daily and
+# per-channel aggregates as CSV. Streamlit is never imported. Split exports
+# (<name>-001.zip, <name>-002.zip, ...) are processed together as account <name>.
+#
+# With --store DIR every sub-directory of the input is one account holding its
+# successive exports; they are merged into the persistent history store in
+# name order and only events newer than the stored history are processed.
+#
+# With --sketches every account also gets <account>.sketches.json, mergeable
+# distinct-count and top-k sketches, and all accounts are pooled into
+# pooled.sketches.json.
+#
+# With --report every account also gets <account>.html, the offline Wrapped
+# report (see Report.py), built in the account's worker process; with -j 1 its
+# figures are built in YT_WRAPPED_REPORT_WORKERS processes. Report thumbnails
+# come from --thumbnails: only those already cached unless a directory or
+# "remote" is given, so a batch never waits on img.youtube.com by surprise.
+#
+# Days, hours and weeks are counted in --timezone (default YT_WRAPPED_TIMEZONE,
+# else UTC).
+#
+# YT_WRAPPED_PROFILE=1 YT_WRAPPED_PROFILE_LOG=profile.jsonl records the time,
+# rows and peak memory of the load/estimate/aggregate stages of each archive.
+
+def _json_default(value):
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    if isinstance(value, pd.Series):
+        return value.to_dict()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Cannot serialise {type(value).__name__}")
+
+PART = re.compile(r"^(.+)-\d{3}\.zip$", re.IGNORECASE)
+
+# Processes building the figures of a report (None: Report.REPORT_WORKERS)
+_report_workers = 1
+
+def _init_worker(use_cache, store_dir, timezone, thumbnails="off", report_workers=1):
+    global _report_workers
+    from Handler import Cache, Thumbnails
+    import Handler.Utils as Utils
+    Thumbnails.fetcher = Thumbnails.fetcher_for(thumbnails)
+    _report_workers = report_workers
+    # Archives are already spread over the pool; parse members in-process
+    Utils.PARSE_WORKERS = 1
+    if timezone:
+        Utils.TIMEZONE = timezone
+    if not use_cache:
+        Cache.CACHE_MAX_MB = 0
+    if store_dir:
+        from Handler import Store
+        Store.STORE_DIR = store_dir
+
+def _write_outputs(account, df, agg, search_df, out_dir, sketches=False, report=False):
+    from Analytics import calculate_kpis, sessionize, watch_sketches, weekday_order
+
+    kpis = dataclasses.asdict(calculate_kpis(sessionize(df), agg))
+    kpis["busiest_day"] = weekday_order[kpis["busiest_day"]]
+    kpis["total_hours"] = df['watch_time_hours'].sum()
+    kpis["videos"] = len(df)
+    kpis["searches"] = 0 if search_df is None else len(search_df)
+
+    with open(os.path.join(out_dir, f"{account}.kpis.json"), "w", encoding="utf-8") as f:
+        json.dump(kpis, f, default=_json_default, ensure_ascii=False, indent=2)
+    daily = agg['cube'].groupby(['day', 'video_type'])[['count', 'hours']].sum().reset_index()
+    daily.insert(0, 'date', pd.to_datetime(daily.pop('day'), unit='D').dt.date)
+    daily.to_csv(os.path.join(out_dir, f"{account}.daily.csv"), index=False)
+    agg['channels'].to_csv(os.path.join(out_dir, f"{account}.channels.csv"), index_label='channel')
+    if sketches:
+        with open(os.path.join(out_dir, f"{account}.sketches.json"), "w", encoding="utf-8") as f:
+            json.dump(watch_sketches(df).to_dict(), f, ensure_ascii=False)
+    if report:
+        import Report
+        Report.write(os.path.join(out_dir, f"{account}.html"), df, agg, search_df, title=account, workers=_report_workers)
+
+def _pool_sketches(accounts, out_dir):
+    # Merge the accounts' sketches into one pooled summary, without going back
+    # to their events
+    from Handler import Sketches
+
+    pooled = None
+    for account in accounts:
+        path = os.path.join(out_dir, f"{account}.sketches.json")
+        if not os.path.exists(path):
+            continue
+        with open(path, encoding="utf-8") as f:
+            cells = Sketches.Cells.from_dict(json.load(f))
+        pooled = cells if pooled is None else pooled.merge(cells)
+    if pooled is None:
+        return
+    with open(os.path.join(out_dir, "pooled.sketches.json"), "w", encoding="utf-8") as f:
+        json.dump(pooled.to_dict(), f, ensure_ascii=False)
+    selected = pooled.select()
+    for col, name in [('channel', "channels"), ('video_title', "videos")]:
+        hll, hitters = selected[col]
+        top = ", ".join(f"{item} ({count:,}+)" for item, count in hitters.top(3)['count'].items())
+        print(f"  pooled: ≈{hll.estimate():,.0f} {name} (±{2 * hll.relative_error:.1%}); top: {top} (counts at most {hitters.error:,} low)")
+
+def _export_name(zip_name):
+    match = PART.match(zip_name)
+    return match.group(1) if match else os.path.splitext(zip_name)[0]
+
+def _group_parts(names):
+    # {export: [zip names]}, the parts of a split export grouped together
+    groups = {}
+    for name in sorted(names):
+        groups.setdefault(_export_name(name), []).append(name)
+    return groups
+
+def process_archive(paths, out_dir, sketches=False, report=False):
+    import Handler.Utils as Utils
+    from Handler import Profiler
+    from Analytics import build_cube, estimate_watch_time_hours
+
+    start = time.perf_counter()
+    account = _export_name(os.path.basename(paths[0]))
+    Profiler.start(label=account)
+    watch_df, search_df = Utils.load_takeout(paths)
+    if watch_df is None or watch_df.empty:
+        return account, 0, time.perf_counter() - start
+
+    df = Profiler.stage(estimate_watch_time_hours)(watch_df)
+    _write_outputs(account, df, Profiler.stage(build_cube)(df), search_df, out_dir, sketches, report)
+    return account, len(df), time.perf_counter() - start
+
+def process_account(account_dir, out_dir, sketches=False, report=False):
+    from Handler import Store
+
+    start = time.perf_counter()
+    account = os.path.basename(os.path.normpath(account_dir))
+    exports = _group_parts(name for name in os.listdir(account_dir) if name.lower().endswith(".zip"))
+    added = sum(Store.ingest(account, [os.path.join(account_dir, name) for name in parts]) for parts in exports.values())
+    if not added and not os.path.exists(os.path.join(Store.STORE_DIR, account, "tail.parquet")):
+        return account, 0, time.perf_counter() - start
+
+    _write_outputs(account, Store.load_events(account), Store.load_aggregates(account),
+                   Store.load_searches(account), out_dir, sketches, report)
+    return account, added, time.perf_counter() - start
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate YouTube Wrapped summaries for a directory of takeout zips.")
+    parser.add_argument("input", help="directory containing takeout .zip files (account directories with --store)")
+    parser.add_argument("-o", "--output", default="wrapped", help="directory for the per-account output files")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="worker processes (default: all cores)")
+    parser.add_argument("--no-cache", action="store_true", help="do not read or write the parsed-takeout cache")
+    parser.add_argument("--store", help="merge per-account export directories into this history store")
+    parser.add_argument("--sketches", action="store_true", help="also write mergeable distinct-count/top-k sketches and pool them across accounts")
+    parser.add_argument("--report", action="store_true", help="also write a self-contained offline HTML report per account")
+    parser.add_argument("--thumbnails", metavar="SOURCE", default=os.environ.get("YT_WRAPPED_THUMB_SOURCE", "off"),
+                        help="where report thumbnails not cached yet come from: a directory of <video id>.jpg files, "
+                             "'remote' for img.youtube.com or 'off' (default: YT_WRAPPED_THUMB_SOURCE, else off)")
+    parser.add_argument("--timezone", help="IANA time zone days and hours are counted in (default: YT_WRAPPED_TIMEZONE or UTC)")
+    args = parser.parse_args(argv)
+    if args.timezone:
+        try:
+            zoneinfo.ZoneInfo(args.timezone)
+        except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+            parser.error(f"unknown time zone: {args.timezone}")
+
+    if args.store:
+        task = process_account
+        archives = [os.path.join(args.input, name) for name in os.listdir(args.input) if os.path.isdir(os.path.join(args.input, name))]
+        size = lambda d: sum(os.path.getsize(os.path.join(d, name)) for name in os.listdir(d))
+    else:
+        task = process_archive
+        groups = _group_parts(name for name in os.listdir(args.input) if name.lower().endswith(".zip"))
+        archives = [[os.path.join(args.input, name) for name in parts] for parts in groups.values()]
+        size = lambda paths: sum(map(os.path.getsize, paths))
+    if not archives:
+        print(f"No {'account directories' if args.store else '.zip files'} found in {args.input}", file=sys.stderr)
+        return 1
+    os.makedirs(args.output, exist_ok=True)
+    # Largest first so one big account does not start last and trail the pool
+    archives.sort(key=size, reverse=True)
+
+    start = time.perf_counter()
+    rows = failed = 0
+    written = []
+    # Accounts are spread over the pool; a single job builds report figures in
+    # parallel instead
+    report_workers = None if args.jobs == 1 else 1
+    initargs = (not args.no_cache, args.store, args.timezone, args.thumbnails, report_workers)
+    with ProcessPoolExecutor(max_workers=args.jobs, initializer=_init_worker, initargs=initargs) as pool:
+        futures = {pool.submit(task, path, args.output, args.sketches, args.report): path for path in archives}
+        for future in as_completed(futures):
+            try:
+                account, n, seconds = future.result()
+            except Exception as e:
+                failed += 1
+                path = futures[future]
+                print(f"  {os.path.basename(path if isinstance(path, str) else path[0])}: failed ({e})", file=sys.stderr)
+                continue
+            rows += n
+            written.append(account)
+            print(f"  {account}: {n:,} events in {seconds:.2f}s")
+    elapsed = time.perf_counter() - start
+
+    done = len(archives) - failed
+    print(f"Processed {done} archive(s), {rows:,} events in {elapsed:.2f}s "
+          f"({done / elapsed:.2f} archives/s, {rows / elapsed:,.0f} rows/s, {args.jobs} workers)")
+    if args.sketches:
+        _pool_sketches(written, args.output)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
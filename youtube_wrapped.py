@@ -1,18 +1,165 @@
-from os import name
-import zipfile
 import streamlit as st
-import pandas as pd
-import numpy as np
-from datetime import datetime
-import plotly.express as px
-import plotly.graph_objects as go
-import seaborn as sns
-from wordcloud import WordCloud
-
-import Handler.Helper as Helper
-import Handler.Utils as Utils
-from Plotter import *
-from Processors import *
+
+from Handler import Profiler
+
+# Only Streamlit is imported up front so the upload screen shows quickly.
+# pandas and the analytics modules load once a takeout is uploaded, plotly
+# (Plotter) when the first tab is drawn.
+
+# --- TABS ---
+# Each tab is a fragment: its widgets (e.g. the period pickers) rerun only that
+# tab, and its aggregates and figures are only built while the tab is open.
+
+@st.fragment
+def highlights_tab(view, agg):
+    import Plotter
+    import Handler.Thumbnails as Thumbnails
+    df = view.df
+    st.subheader("Viewing Patterns")
+    activity = Processors.activity_profile(agg)
+    peak_hour = activity.peak_hour
+
+    sessions = Processors.sessionize(view)
+    kpis = Processors.calculate_kpis(sessions, agg)
+
+    # --- KPIs in 3 Columns ---
+    col1, col2, col3 = st.columns(3)
+    col1.metric("📆 Busiest Day", Processors.weekday_order[kpis.busiest_day], f"{kpis.hours_watched:.2f} hrs | {kpis.videos_watched} video(s)", border=True)
+    col2.metric("⏰ Peak Hour", f"{peak_hour}:00", f"{activity.hour_hours[peak_hour]:.2f} hrs | {activity.hour_videos[peak_hour]} video(s)", border=True)
+    col3.metric("🔥 Longest Binge", f"{kpis.binge.total_hours:.2f} hrs", f"{kpis.binge.video_count} video(s)", border=True)
+
+    col4, col5, col6 = st.columns(3)
+    col4.metric("📅 Consistency", f"{kpis.consistency:.1f}%", f"{kpis.active_days:,} active / {kpis.total_days:,} days", border=True)
+    col5.metric("🕒 Preferred Time", f"{int(kpis.median_hour)}:00", kpis.period, border=True)
+    col6.metric("❤️ Favorite Creator", kpis.top_channel, f"{kpis.top_channel_videos} video(s) | {kpis.avg_watch_time:.1f} hrs", border=True)
+    
+    # --- Expander: Detailed Stats ---
+    with st.expander("📌 Detailed Insights", expanded=True):
+        st.markdown("## 🎯 Viewing Highlights")
+
+        hl = Processors.highlights(view)
+        total_hours = hl.total_hours
+        total_days = total_hours / 24
+        streak = sessions.longest_streak
+
+        # Fetch every card's thumbnail concurrently before rendering the cards
+        cards = hl.milestones + hl.top_watched + hl.top_replayed
+        Thumbnails.prefetch([card.url for card in cards])
+
+        col1, col2 = st.columns(2)
+        col1.metric("⏱️ Total Watch Time", f"{int(total_days)} days of YouTube", f"{int(total_hours)} hrs")
+        col2.metric("📈 Longest Streak", f"{streak} days", "Consecutively active")
+        st.write("")
+        st.markdown("### 📽️ Milestone Moments")
+        cols = st.columns(3)
+        for j, card in enumerate(hl.milestones):
+            Plotter.video_card_in_col(cols[j], card.title, card.url, card.timestamp.strftime('%Y-%m-%d'), card.badge)
+        st.write("")
+
+        st.markdown("### 🏆 Top 5 Videos Watched")
+        cols = st.columns(5)
+        for j, card in enumerate(hl.top_watched):
+            Plotter.video_card_in_col(cols[j], card.title, card.url, card.timestamp.strftime('%Y-%m-%d'), card.badge)
+        st.write("")
+
+        st.markdown("### 🔁 Top 5 Replayed Videos")
+        cols = st.columns(5)
+        for j, card in enumerate(hl.top_replayed):
+            Plotter.video_card_in_col(cols[j], card.title, card.url, card.timestamp.strftime('%Y-%m-%d'), card.badge)
+
+        st.write("")
+        st.caption("💡 These highlight cards reflect your top moments on YouTube.")
+
+@st.fragment
+def watch_trends_tab(view, view_index):
+    import Plotter
+    st.subheader("Daily Watch Time")
+    period_df, period_label = Helper.periodize(view.df, "watch", view_index)
+    period_agg = Processors.build_cube(view.derive(period_df, "period", period_label))
+    Plotter.plot_daily_video_watch_time_by_type(period_agg, period_label)
+    Plotter.plot_daily_video_watch_count_by_type(period_agg, period_label)
+
+def approx_hitters(approx, period_label, column):
+    # Heavy hitters of `column` for the period from the sketch cells, or None
+    # when approximate mode is off or the period is a week
+    if approx is None:
+        return None
+    cells, year_range, video_type = approx
+    months = Sketches.span(period_label, year_range)
+    return cells.select(*months, video_type)[column][1] if months else None
+
+@st.fragment
+def top_channels_tab(view, view_index, approx=None):
+    import Plotter
+    st.subheader("Most Watched Channels")
+    period_df, period_label = Helper.periodize(view.df, "channel", view_index)
+    period_agg = Processors.build_cube(view.derive(period_df, "period", period_label))
+    hitters = approx_hitters(approx, period_label, 'channel')
+    if hitters is None:
+        Plotter.plot_top_channels_clicked(period_agg, period_label)
+    else:
+        Plotter.plot_heavy_hitters(hitters, f"📺 Top 15 most clicked channels - {period_label}", "Channel", 15, 'Viridis')
+    Plotter.plot_top_channels_watched(period_agg, period_label)
+
+@st.fragment
+def top_videos_tab(view, view_index, approx=None):
+    import Plotter
+    st.subheader("Top Videos")
+    period_df, period_label = Helper.periodize(view.df, "video", view_index)
+    period_agg = Processors.build_cube(view.derive(period_df, "period", period_label))
+    hitters = approx_hitters(approx, period_label, 'video_title')
+    if hitters is None:
+        Plotter.plot_top_videos_clicked(period_agg, period_label)
+    else:
+        Plotter.plot_heavy_hitters(hitters, f"Top 10 most clicked videos - {period_label}", "Video Title")
+    Plotter.plot_top_videos_watched(period_agg, period_label)
+
+@st.fragment
+def behaviour_tab(agg):
+    import Plotter
+    st.subheader("🗓️ Viewing by Weekday")
+    Plotter.plot_viewing_by_weekday(agg)
+
+    st.subheader("Weekend vs Weekday")
+    Plotter.plot_weekend_vs_weekday(agg)
+
+    st.subheader("🎥 Video Type Distribution")
+    Plotter.plot_video_type_distribution(agg)
+
+    st.subheader("⏰ Hour vs Day Activity")
+    Plotter.plot_hour_day_heatmap(agg)
+
+    st.subheader("📆 Weekly Viewing Rhythm")
+    Plotter.plot_weekly_viewing_rhythm(agg)
+
+@st.fragment
+def search_tab(search_ds, view, agg, with_watch, approx=False):
+    import Plotter
+    st.markdown("### 🔍 Your YouTube Searches")
+    Plotter.plot_search_intensity_gauge(search_ds, agg)
+    if approx:
+        queries = Processors.search_sketches(search_ds).select()['query'][1]
+        Plotter.plot_heavy_hitters(queries, "Top 20 YouTube Search Queries", "Query", 20, 'RdBu')
+    else:
+        Plotter.plot_top_youtube_queries_interactive(search_ds)
+
+    st.markdown("⏱️ Search Timing Heatmap")
+    Plotter.plot_search_temporal_patterns_interactive(search_ds)
+
+    if with_watch:
+        st.markdown("🔁 Compare Search vs Watch Activity")
+        Plotter.compare_search_watch_trends_interactive(search_ds, agg)
+
+        st.markdown("### 🎯 Search to Watch Conversion")
+        window = st.select_slider("Minutes after a search that count towards it", options=[5, 10, 15, 30, 60, 120],
+                                  value=Processors.CONVERSION_WINDOW_MIN, key="conversion_window")
+        conversion = Processors.search_conversion(search_ds, view, window)
+        col1, col2, col3 = st.columns(3)
+        col1.metric("🎯 Conversion Rate", f"{conversion.rate:.1%}", f"{conversion.converted:,} of {conversion.searches:,} searches", border=True)
+        col2.metric("⏳ Time to First Watch", f"{conversion.median_minutes:.1f} min", "median", delta_color="off", border=True)
+        col3.metric("⌛ Hours Led To", f"{conversion.hours:.1f} hrs", f"within {window} min of a search", delta_color="off", border=True)
+        Plotter.plot_top_converting_queries(conversion)
+        Plotter.plot_time_to_first_watch(conversion)
 
 # --- Streamlit APP ---
 
@@ -21,47 +168,78 @@ search_flag = False
 
 st.set_page_config(page_title="YouTube Wrapped Dashboard", layout="wide", page_icon="📺")
 
+# Stage timings for this rerun: YT_WRAPPED_PROFILE=1 or ?profile=1
+Profiler.start(st.query_params.get("profile") == "1")
+
 st.title("📺 YouTube Wrapped Dashboard")
 st.sidebar.markdown("## 🎭 How Are You Feeling?")
 mood = st.sidebar.selectbox("Pick your YouTube mood:", ["🎉 Loving it!", "🤔 Could be better", "😴 Too much binge", "🚀 On fire!", "😱 OMG!"])
 
 st.sidebar.markdown("## 📁 Upload Your Data")
 
-uploaded_zip = st.sidebar.file_uploader("Upload a ZIP file (Eg:`takeout-20250531T201211Z-001.zip`)", type="zip")
-if uploaded_zip is not None:
-    with zipfile.ZipFile(uploaded_zip) as z:
-        for filename in z.namelist():
-            if filename.endswith("watch-history.json"):
-                with z.open(filename) as f:
-                    watch_df = Utils.load_youtube_watch_history(f)
-                    watch_flag=True
-            if filename.endswith("search-history.json"):
-                with z.open(filename) as f:
-                    search_df = Utils.load_youtube_search_history(f)
-                    search_flag=True
+# Large exports are split into -001.zip, -002.zip, ...: all parts can be uploaded together
+uploaded_zips = st.sidebar.file_uploader("Upload the ZIP file(s) (Eg:`takeout-20250531T201211Z-001.zip`)", type="zip", accept_multiple_files=True)
+if uploaded_zips:
+    import Handler.Helper as Helper
+    import Handler.Sketches as Sketches
+    import Handler.Utils as Utils
+    import Processors
+    watch_ds, search_ds = Utils.load_datasets(uploaded_zips, Helper.pick_time_zone(Utils.TIMEZONE))
+    watch_flag = watch_ds is not None
+    search_flag = search_ds is not None
 
 if watch_flag and search_flag:
+    # Cached functions take Dataset handles, keyed by the archive fingerprint
+    # plus the filters applied, instead of hashing whole frames on every rerun.
+    # Watch time is estimated once on the full history; the filters below are
+    # slices of the enriched frame, so moving them never re-runs the estimate
+    # and an event's duration does not depend on the range selected
+    enriched = watch_ds.derive(Processors.estimate_watch_time_hours(watch_ds), "estimate")
+    watch_df, search_df = enriched.df, search_ds.df
 
-    min_year, max_year = int(watch_df['year'].min()), int(watch_df['year'].max())
-    min_date, max_date = watch_df['timestamp'].iloc[-1], watch_df['timestamp'].iloc[0]
+    watch_index = Processors.time_index(enriched)
+    years = watch_index.years()
+    min_year, max_year = years[0], years[-1]
+    min_date, max_date = watch_df['timestamp'].iloc[0], watch_df['timestamp'].iloc[-1]
 
-    total_days = (watch_df['timestamp'].max().date() - watch_df['timestamp'].min().date()).days + 1
+    total_days = (max_date.date() - min_date.date()).days + 1
 
     st.sidebar.markdown("## 🎛️ Filters")
     year_range = st.sidebar.slider("Select Year Range", min_year, max_year, (min_year, max_year), 1)
     video_type_filter = st.sidebar.radio("🎞️ Video Type", ["All", "Short", "Long"])
+    approximate = st.sidebar.toggle("≈ Approximate statistics", value=Sketches.APPROX,
+                                    help="Distinct counts and top-k from sketches built once per dataset "
+                                         "(HyperLogLog, Misra-Gries), shown with their error bounds.")
 
-    filtered_df = watch_df[(watch_df['year'] >= year_range[0]) & (watch_df['year'] <= year_range[1])]
-    df = estimate_watch_time_hours(filtered_df)
+    view = enriched.derive(watch_df.iloc[watch_index.year_slice(*year_range)], "years", year_range)
     if video_type_filter != "All":
-        df = df[df['video_type'] == video_type_filter]
+        view = view.derive(view.df[view.df['video_type'] == video_type_filter], "type", video_type_filter)
+    df = view.df
+    agg = Processors.build_cube(view)
+    view_index = Processors.time_index(view)
+
+    st.sidebar.markdown("## 📄 Export")
+    if st.sidebar.button("Build offline report", help="The dashboard for the current filters as one HTML file that opens without a server or network access."):
+        st.session_state["report_key"] = view.key
+    if st.session_state.get("report_key") == view.key:
+        st.sidebar.download_button("⬇️ Download report", Processors.wrapped_report(view, agg, search_ds),
+                                   file_name="youtube_wrapped.html", mime="text/html")
 
     col1, col2, col3, col4, col5 = st.columns(5)
     col1.metric("⌛ Total Hours", f"{df['watch_time_hours'].sum():.1f} hrs", help="Total hours spent on youtube", delta_color="off")
     col2.metric("🟠 Shorts", f"{df[df['video_type'] == 'Short']['watch_time_hours'].sum():.1f} hrs")
     col3.metric("🔵 Longs", f"{df[df['video_type'] == 'Long']['watch_time_hours'].sum():.1f} hrs")
-    col4.metric("📺 Channels", f"{df['channel'].nunique()}")
-    col5.metric("🎞️ Videos", f"{df['video_title' ].nunique()}")
+    approx = None
+    if approximate:
+        # Sketch cells of the whole history, merged for the filters
+        approx = (Processors.watch_sketches(enriched), year_range, None if video_type_filter == "All" else video_type_filter)
+        selected = approx[0].select(*Sketches.span("All Time", year_range), approx[2])
+        channels, videos = selected['channel'][0], selected['video_title'][0]
+        col4.metric("📺 Channels", f"≈{channels.estimate():,.0f}", f"±{2 * channels.relative_error:.1%} (95%)", delta_color="off")
+        col5.metric("🎞️ Videos", f"≈{videos.estimate():,.0f}", f"±{2 * videos.relative_error:.1%} (95%)", delta_color="off")
+    else:
+        col4.metric("📺 Channels", f"{df['channel'].nunique()}")
+        col5.metric("🎞️ Videos", f"{df['video_title' ].nunique()}")
 
 tab_labels = ["🗓️ Highlights", "📈 Watch Trends", "🎥 Top Channels", "🎬 Top Videos", "📅 Behavioural Insights"] if watch_flag else []
 if search_flag:
@@ -70,117 +248,57 @@ if search_flag:
 if not tab_labels:
     st.info("Please upload Google takeout zip file to see the dashboard.")
 else:
-    tabs = st.tabs(tab_labels)
+    tabs = Helper.lazy_tabs(tab_labels, key="tab")
     i=0
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
 
     if not watch_df.empty:
         with tabs[i]:
-            st.subheader("Viewing Patterns")
-            active_days = df['date'].nunique()
-            by_day, day_vids, by_hour, hour_vids = active_day_hour(df)
-
-            kpis = calculate_kpis(df)
-
-            # --- KPIs in 3 Columns ---
-            col1, col2, col3 = st.columns(3)
-            col1.metric("📆 Busiest Day", kpis["busiest_day"], f"{kpis['hours_watched']:.2f} hrs | {kpis['videos_watched']} video(s)", border=True)
-            col2.metric("⏰ Peak Hour", f"{by_hour.idxmax()}:00", f"{by_hour.max():.2f} hrs | {hour_vids[by_hour.idxmax()]} video(s)", border=True)
-            col3.metric("🔥 Longest Binge", f"{kpis['binge']['total_hours']:.2f} hrs", f"{kpis['binge']['video_count']} video(s)", border=True)
-
-            col4, col5, col6 = st.columns(3)
-            col4.metric("📅 Consistency", f"{kpis['consistency']:.1f}%", f"{kpis['active_days']:,} active / {kpis['total_days']:,} days", border=True)
-            col5.metric("🕒 Preferred Time", f"{int(kpis['median_hour'])}:00", kpis["period"], border=True)
-            col6.metric("❤️ Favorite Creator", kpis["top_channel"], f"{max(df['channel'].value_counts())} video(s) | {kpis['avg_watch_time']:.1f} hrs", border=True)
-            
-            # --- Expander: Detailed Stats ---
-            with st.expander("📌 Detailed Insights", expanded=True):
-                st.markdown("## 🎯 Viewing Highlights")
-
-                total_hours = df['watch_time_hours'].sum()
-                total_days = total_hours / 24
-                streak = longest_streak(df['date'])
-                top5_watched = df.sort_values('watch_time_hours', ascending=False).drop_duplicates('url').head(5)
-                top5_titles = df['url'].value_counts().head(5).index
-                top5_replayed_rows = df[df['url'].isin(top5_titles)].drop_duplicates(subset='url', keep='first')
-
-                col1, col2 = st.columns(2)
-                col1.metric("⏱️ Total Watch Time", f"{int(total_days)} days of YouTube", f"{int(total_hours)} hrs")
-                col2.metric("📈 Longest Streak", f"{streak} days", "Consecutively active")
-                st.write("")
-                st.markdown("### 📽️ Milestone Moments")
-                cols = st.columns(3)
-                milestones = [(0, "1st"), (99, "100th"), (999, "1000th")]
-                j=0
-                for index, label in milestones:
-                    if index < len(df):
-                        row = df.sort_values('timestamp').iloc[index]
-                        video_card_in_col(cols[j],row['video_title'],row['url'],row['timestamp'].strftime('%Y-%m-%d'),label)
-                        j+=1
-                st.write("")
-
-                st.markdown("### 🏆 Top 5 Videos Watched")
-                cols = st.columns(5)
-                for j, (_, row) in enumerate(top5_watched.iterrows()):
-                    video_card_in_col(cols[j], row['video_title'], row['url'], row['timestamp'].strftime('%Y-%m-%d'),j+1)
-                st.write("")
-
-                st.markdown("### 🔁 Top 5 Replayed Videos")
-                cols = st.columns(5)
-                for j, (_, row) in enumerate(top5_replayed_rows.iterrows()):
-                    video_card_in_col(cols[j], row['video_title'], row['url'], row['timestamp'].strftime('%Y-%m-%d'),f"{df['url'].value_counts()[row['url']]}× views")
-
-                st.write("")
-                st.caption("💡 These highlight cards reflect your top moments on YouTube.")
+            if Helper.is_open(tabs[i]):
+                highlights_tab(view, agg)
             i+=1
 
         with tabs[i]:
-            st.subheader("Daily Watch Time")
-            val_ret=Helper.periodize(df, "watch")
-            plot_daily_video_watch_time_by_type(*val_ret)
-            plot_daily_video_watch_count_by_type(*val_ret)
+            if Helper.is_open(tabs[i]):
+                watch_trends_tab(view, view_index)
             i+=1
 
         with tabs[i]:
-            st.subheader("Most Watched Channels")
-            val_ret=Helper.periodize(df, "channel")
-            plot_top_channels_clicked(*val_ret)
-            plot_top_channels_watched(*val_ret)
+            if Helper.is_open(tabs[i]):
+                top_channels_tab(view, view_index, approx)
             i+=1
 
         with tabs[i]:
-            st.subheader("Top Videos")
-            val_ret=Helper.periodize(df, "video")
-            plot_top_videos_clicked(*val_ret)
-            plot_top_videos_watched(*val_ret) 
+            if Helper.is_open(tabs[i]):
+                top_videos_tab(view, view_index, approx)
             i+=1
 
         with tabs[i]:
-            st.subheader("🗓️ Viewing by Weekday")
-            plot_viewing_by_weekday(df)
-
-            st.subheader("Weekend vs Weekday")
-            plot_weekend_vs_weekday(df)
-
-            st.subheader("🎥 Video Type Distribution")
-            plot_video_type_distribution(df)
-
-            st.subheader("⏰ Hour vs Day Activity")
-            plot_hour_day_heatmap(df)
-
-            st.subheader("📆 Weekly Viewing Rhythm")
-            plot_weekly_viewing_rhythm(df)
+            if Helper.is_open(tabs[i]):
+                behaviour_tab(agg)
             i+=1
 
     if not search_df.empty:
         with tabs[i]:
-            st.markdown("### 🔍 Your YouTube Searches")
-            st.plotly_chart(plot_search_intensity_gauge(search_df, df), use_container_width=True)
-
-            st.markdown("⏱️ Search Timing Heatmap")
-            plot_search_temporal_patterns_interactive(search_df)
+            if Helper.is_open(tabs[i]):
+                search_tab(search_ds, view, agg, not watch_df.empty, approx is not None)
+            i+=1
 
-            if not watch_df.empty:
-                st.markdown("🔁 Compare Search vs Watch Activity")
-                compare_search_watch_trends_interactive(search_df, df)
-                i+=1
\ No newline at end of file
+# --- DIAGNOSTICS ---
+if Profiler.active():
+    entries = Profiler.records()
+    with st.expander("🩺 Diagnostics", expanded=False):
+        misses = sum(e["cache"] == "miss" for e in entries)
+        hits = sum(e["cache"] == "hit" for e in entries)
+        top = sum(e["seconds"] for e in entries if e["depth"] == 0)
+        memory = "peak memory via tracemalloc, process-wide" if Profiler.ENABLED else "peak memory with YT_WRAPPED_PROFILE=1 only"
+        st.caption(f"{len(entries)} stage calls | {top:.3f} s | cache {hits} hit(s), {misses} miss(es) | {memory}")
+        from Handler import Cache
+        # Shared by every session of the server, counted since it started
+        shared = Cache.results.stats()
+        hit_rate = "–" if shared["hit_rate"] is None else f"{shared['hit_rate']:.0%}"
+        st.caption(f"Shared result cache: {shared['entries']} entries | {shared['bytes'] / 1024 ** 2:.1f} of "
+                   f"{shared['max_bytes'] / 1024 ** 2:.0f} MB | hit rate {hit_rate} | {shared['evictions']} eviction(s)")
+        pinned = Cache.datasets.stats()
+        st.caption(f"Uploads pinned by sessions: {pinned['entries']} frame set(s) | {pinned['bytes'] / 1024 ** 2:.1f} MB")
+        st.dataframe(entries, use_container_width=True, hide_index=True)
+        st.download_button("⬇️ Export JSON lines", Profiler.jsonl(entries), file_name="youtube_wrapped_profile.jsonl", mime="application/jsonl")